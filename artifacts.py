@@ -0,0 +1,237 @@
+# 文件名: artifacts.py
+# 反例 / 险例存档: 审计中失败的样本和 slack 最小的 top-K 样本写入压缩 .npz 分片,
+# 每个样本在 index.jsonl 里占一行 (定理, 参数, 种子, 序号); 之后可批量载入,
+# 用 matrix_utils 的 checker 重新检验, 装了 mpmath 时再做一次高精度检验
+import os
+import json
+import itertools
+from math import comb
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+import matrix_utils as utils
+import audits
+
+try:
+    import mpmath
+except ImportError:
+    mpmath = None
+
+INDEX_FILE = "index.jsonl"
+
+# 每个 (定理, n) 默认保留的险例 / 失败样本个数
+TOP_K = 20
+MAX_FAILURES = 1000
+
+# 高精度重新检验的十进制位数
+HP_DPS = 50
+
+# ==========================================
+# 写盘
+# ==========================================
+class ArtifactStore:
+    """有界存档目录: 每个 (定理, n) 一个 .npz 分片 + 共享的 index.jsonl
+    审计热循环只往 audits.CandidatePool 里记 (slack, 序号); submit() 把候选交给后台线程,
+    由它按种子重新生成矩阵并压缩写盘, 所以存档不拖慢审计本身"""
+    def __init__(self, directory, top_k=TOP_K, max_failures=MAX_FAILURES):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.top_k = top_k
+        self.max_failures = max_failures
+        self.saved = 0
+        self._writer = ThreadPoolExecutor(max_workers=1)
+        self._pending = []
+
+    def submit(self, theorem, n, seed, pool, field="complex"):
+        if pool is None: return
+        items = pool.items()
+        if items: self._pending.append(self._writer.submit(self.write_shard, theorem, n, seed, items, field))
+
+    def write_shard(self, theorem, n, seed, items, field="complex"):
+        """重新生成 items 里的样本, 写成一个压缩分片 (先写临时文件再改名), 然后追加索引
+        field 为随机矩阵的数域; 实数域的分片名里带 _real, 与同种子的复数域分片区分"""
+        tag = "" if field == "complex" else f"_{field}"
+        name = f"{theorem}{tag}_n{n}_seed{seed}.npz"
+        arrays, records = {}, []
+        for j, (index, passed, slack) in enumerate(items):
+            params, data = audits.capture_sample(theorem, n, seed, index, field)
+            key = f"s{j}"
+            for array_name, value in data.items(): arrays[f"{key}_{array_name}"] = value
+            records.append({"file": name, "key": key, "theorem": theorem, "n": n, "seed": seed, "field": field,
+                            "index": int(index), "kind": "near_miss" if passed else "failure",
+                            "slack": float(slack), "params": params, "arrays": sorted(data)})
+
+        path = os.path.join(self.directory, name)
+        with open(path + ".tmp", "wb") as f:
+            np.savez_compressed(f, **arrays)
+        os.replace(path + ".tmp", path)
+        with open(os.path.join(self.directory, INDEX_FILE), "a") as f:
+            for rec in records: f.write(json.dumps(rec) + "\n")
+        self.saved += len(records)
+
+    def close(self):
+        """等待全部分片写完; 后台线程里的异常在这里抛出"""
+        try:
+            for fut in self._pending: fut.result()
+        finally:
+            self._pending = []
+            self._writer.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# ==========================================
+# 载入
+# ==========================================
+def load_index(directory, theorem=None):
+    """读取索引; 同一 (分片, key) 重复写入时以最后一次为准"""
+    records = {}
+    with open(os.path.join(directory, INDEX_FILE)) as f:
+        for line in f:
+            if not line.strip(): continue
+            rec = json.loads(line)
+            if theorem is None or rec["theorem"] == theorem:
+                records[(rec["file"], rec["key"])] = rec
+    return list(records.values())
+
+def load_artifacts(directory, theorem=None):
+    """逐个产出 (record, arrays); 每个分片只打开一次"""
+    records = sorted(load_index(directory, theorem), key=lambda rec: rec["file"])
+    for name, group in itertools.groupby(records, key=lambda rec: rec["file"]):
+        with np.load(os.path.join(directory, name)) as data:
+            for rec in group:
+                yield rec, {field: data[f"{rec['key']}_{field}"] for field in rec["arrays"]}
+
+# ==========================================
+# 重新检验
+# ==========================================
+def float_slack(rec, arrays):
+    """用存档的输入重新走一遍 matrix_utils 的 checker, 返回 (passed, slack)"""
+    theorem, n, p = rec["theorem"], rec["n"], rec["params"]
+    if theorem == "bounds":
+        passed, val, lb, ub = utils.check_bounds_theorem(n, p["l"], p["r"], A=arrays["A"])
+        return passed, audits.bounds_slack(val, lb, ub)
+    if theorem == "hierarchy":
+        passed, _, cum_left, cum_right, _ = utils.check_hierarchy_theorem(n, p["m"], p["k"], A=arrays["A"])
+        return passed, audits.hierarchy_slack(cum_left, cum_right)
+    inputs = (arrays["lambdas"], arrays["u"])
+    if theorem == "weighted":
+        passed, sum_mu, lhs, rhs, _ = utils.check_weighted_theorem(n, p["l"], p["r"], stress_mode=True, inputs=inputs)
+        return passed, audits.weighted_slack(sum_mu, lhs, rhs)
+    passed, _, _, _, _, res = utils.check_lemma_polynomial(n, stress_mode=True, inputs=inputs)
+    return passed, audits.lemma_slack(res)
+
+def _mp_eigvals(M):
+    """Hermitian 矩阵的全部特征值 (mpmath), 降序"""
+    if np.iscomplexobj(M) and np.any(M.imag):
+        E = mpmath.eighe(mpmath.matrix(M.tolist()), eigvals_only=True)
+    else:
+        E = mpmath.eigsy(mpmath.matrix(np.real(M).tolist()), eigvals_only=True)
+    return sorted((mpmath.re(e) for e in E), reverse=True)
+
+def _mp_projected_spectrum(lambdas, u):
+    """diag(lambdas) 压缩到 u 的正交补上的特征值 (降序)
+    Householder 反射 H 把 u 映到 -sign(u_1)|u| e_1, H 的后 n-1 列即 u⊥ 的一组正交基"""
+    n = len(lambdas)
+    v = [mpmath.mpf(x) for x in u]
+    norm = mpmath.sqrt(mpmath.fsum(x * x for x in v))
+    v[0] += norm if v[0] >= 0 else -norm
+    vv = mpmath.fsum(x * x for x in v)
+    H = mpmath.eye(n)
+    for i in range(n):
+        for j in range(n):
+            H[i, j] -= 2 * v[i] * v[j] / vv
+    V = H[:, 1:]
+    M = V.T * mpmath.diag([mpmath.mpf(x) for x in lambdas]) * V
+    E = mpmath.eigsy(M, eigvals_only=True)
+    return sorted(E, reverse=True)
+
+def _mp_weights(u):
+    w = [mpmath.mpf(x) ** 2 for x in u]
+    total = mpmath.fsum(w)
+    return [x / total for x in w]
+
+def _mp_partial_sums(X, c, t):
+    """utils.weighted_partial_sums 的 mpmath 版本"""
+    prefix = [mpmath.mpf(0)]
+    for x in X: prefix.append(prefix[-1] + x)
+    out = []
+    for ti in t:
+        q = min(int(ti) // c, len(X) - 1)
+        out.append(c * prefix[q] + (int(ti) - q * c) * X[q])
+    return np.array(out, dtype=object)
+
+def hp_bounds(n, p, arrays):
+    A, l, r = arrays["A"], p["l"], p["r"]
+    lam = _mp_eigvals(A)
+    total = mpmath.mpf(0)
+    for i in range(n):
+        keep = np.delete(np.arange(n), i)
+        total += mpmath.fsum(_mp_eigvals(A[np.ix_(keep, keep)])[l-1:r])
+    lb = (r - l + 1) * lam[l-1] + (n - 1) * mpmath.fsum(lam[l:r+1])
+    ub = (n - 1) * mpmath.fsum(lam[l-1:r]) + (r - l + 1) * lam[r]
+    return audits.bounds_slack(total, lb, ub)
+
+def hp_hierarchy(n, p, arrays):
+    A, m, k = arrays["A"], p["m"], p["k"]
+    spectra = {}
+    for s in (m, k):
+        vals = []
+        for idx in itertools.combinations(range(n), s):
+            vals.extend(_mp_eigvals(A[np.ix_(idx, idx)]))
+        spectra[s] = sorted(vals, reverse=True)
+    c_m = comb(m-1, k-1)
+    c_k = comb(n-k, m-k)
+    # 断点与 float 版本相同 (只依赖 n, m, k)
+    total = len(spectra[m]) * c_m
+    t = np.union1d(np.arange(c_m, total + 1, c_m), np.arange(c_k, total + 1, c_k))
+    t = np.union1d([1], t)
+    return audits.hierarchy_slack(_mp_partial_sums(spectra[m], c_m, t), _mp_partial_sums(spectra[k], c_k, t))
+
+def hp_weighted(n, p, arrays):
+    lam = [mpmath.mpf(x) for x in arrays["lambdas"]]
+    w = _mp_weights(arrays["u"])
+    mus = _mp_projected_spectrum(arrays["lambdas"], arrays["u"])
+    l, r = p["l"], min(p["r"], n - 2)
+    sum_mu = mpmath.fsum(mus[l:r+1])
+    U_l = mpmath.fsum(w[l:])
+    L_r_plus_1 = mpmath.fsum(w[:r+2])
+    if U_l < 1e-12 or L_r_plus_1 < 1e-12: return mpmath.inf
+    rhs = mpmath.fsum(lam[l:r+1]) - mpmath.fsum(w[i] / U_l * (lam[i] - lam[r+1]) for i in range(l, r + 1))
+    lhs = mpmath.fsum(lam[l+1:r+2]) + mpmath.fsum(w[i] / L_r_plus_1 * (lam[l] - lam[i]) for i in range(l + 1, r + 2))
+    return audits.weighted_slack(sum_mu, lhs, rhs)
+
+def hp_lemma(n, p, arrays):
+    lam = [mpmath.mpf(x) for x in arrays["lambdas"]]
+    w = _mp_weights(arrays["u"])
+    mus = _mp_projected_spectrum(arrays["lambdas"], arrays["u"])
+    # 残差尺度与 utils.poly_log_magnitude 相同 (含 tau 下限)
+    tau = np.sqrt(np.finfo(float).eps) * max(np.max(np.abs(arrays["lambdas"])), 1.0)
+    max_res = mpmath.mpf(0)
+    for x in mus:
+        val = mpmath.fsum(w[i] * mpmath.fprod(lam[j] - x for j in range(n) if j != i) for i in range(n))
+        scale = mpmath.fsum(w[i] * mpmath.fprod(max(abs(lam[j] - x), tau) for j in range(n) if j != i) for i in range(n))
+        if scale > 0: max_res = max(max_res, abs(val) / scale)
+    return audits.lemma_slack(max_res)
+
+HP_CHECKS = {
+    "bounds": hp_bounds,
+    "weighted": hp_weighted,
+    "hierarchy": hp_hierarchy,
+    "lemma": hp_lemma,
+}
+
+def recheck(rec, arrays, high_precision=True, dps=HP_DPS):
+    """重新检验一个存档样本, 返回 dict
+    float_*: checker 在 float64 下的结论; hp_*: mpmath (dps 位) 下的 slack, 未安装 mpmath 时为 None"""
+    passed, slack = float_slack(rec, arrays)
+    out = {"float_passed": bool(passed), "float_slack": float(slack), "hp_passed": None, "hp_slack": None}
+    if high_precision and mpmath is not None:
+        with mpmath.workdps(dps):
+            hp = HP_CHECKS[rec["theorem"]](rec["n"], rec["params"], arrays)
+            out["hp_slack"] = float(hp)
+            out["hp_passed"] = bool(hp >= -mpmath.mpf(10) ** (-(dps // 2)))
+    return out
@@ -0,0 +1,157 @@
+# 文件名: audit_cli.py
+# 命令行批量审计入口 (无 GUI), 例如:
+#   python -m audit_cli audit --theorem weighted --n 5:30 --samples 1e6
+#   python audit_cli.py audit --theorem all --n 4:8 --samples 1000 --format csv --out audit.csv
+#   python -m audit_cli audit --theorem hierarchy --n 4:12 --samples 1e5 --workers 32 --seed 7
+#   python -m audit_cli replay --theorem hierarchy --n 9 --seed 7 --index 41234
+#   python -m audit_cli audit --theorem weighted --n 5:30 --samples 1e6 --artifacts runs/w --top-k 50
+#   python -m audit_cli recheck --dir runs/w
+#   python -m audit_cli audit --theorem bounds --n 5:30 --samples 1e6 --results runs/b   (逐样本 .npy 列)
+#   python -m audit_cli audit --theorem hierarchy --n 6:10 --samples 1e4 --stages   (各阶段耗时直方图汇总)
+#   python -m audit_cli audit --theorem hierarchy --n 6:12 --samples 1e5 --field real   (实对称矩阵)
+import os
+import sys
+import csv
+import json
+import argparse
+import numpy as np
+
+import matrix_utils as utils
+import audits
+import artifacts
+import result_sink
+
+FIELDS = ["theorem", "n", "samples", "failures", "max_violation", "seconds", "samples_per_sec", "seed", "field"]
+
+def parse_n_range(text):
+    """'5:30' (含两端), '8', 或 '5,7,9'"""
+    if ":" in text:
+        lo, hi = text.split(":")
+        return list(range(int(lo), int(hi) + 1))
+    return [int(v) for v in text.split(",")]
+
+def parse_count(text):
+    """允许 1e6 这样的写法"""
+    value = float(text)
+    if value < 1 or value != int(value):
+        raise argparse.ArgumentTypeError(f"invalid sample count: {text}")
+    return int(value)
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="audit_cli", description="Headless numerical audits of the paper's theorems.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_audit = sub.add_parser("audit", help="run massive validation without the GUI")
+    p_audit.add_argument("--theorem", choices=sorted(audits.SAMPLERS) + ["all"], required=True)
+    p_audit.add_argument("--n", type=parse_n_range, required=True, help="dimension range, e.g. 5:30, 8 or 5,7,9")
+    p_audit.add_argument("--samples", type=parse_count, default=1000, help="samples per dimension (e.g. 1e6)")
+    p_audit.add_argument("--workers", type=int, default=1, help="worker processes (results do not depend on it)")
+    p_audit.add_argument("--seed", type=int, default=None, help="run seed (default: fresh entropy, echoed in the output)")
+    p_audit.add_argument("--format", choices=["jsonl", "csv"], default="jsonl")
+    p_audit.add_argument("--out", default="-", help="output file ('-' for stdout)")
+    p_audit.add_argument("--artifacts", default=None, help="directory for failing / near-miss samples (.npz + index.jsonl)")
+    p_audit.add_argument("--top-k", type=int, default=artifacts.TOP_K, help="smallest-slack passing samples kept per (theorem, n)")
+    p_audit.add_argument("--max-failures", type=int, default=artifacts.MAX_FAILURES, help="failing samples kept per (theorem, n)")
+    p_audit.add_argument("--results", default=None, help="directory for per-sample memory-mapped .npy columns (one subdirectory per theorem)")
+    p_audit.add_argument("--stages", action="store_true", help="record per-stage timing histograms inside the checkers (adds a 'stages' field)")
+    p_audit.add_argument("--field", choices=utils.MATRIX_FIELDS, default="complex",
+                         help="random matrices are complex Hermitian or real symmetric (stress inputs are always real)")
+
+    p_replay = sub.add_parser("replay", help="regenerate and re-check one sample from (seed, n, index)")
+    p_replay.add_argument("--theorem", choices=sorted(audits.SAMPLERS), required=True)
+    p_replay.add_argument("--n", type=int, required=True)
+    p_replay.add_argument("--seed", type=int, required=True)
+    p_replay.add_argument("--index", type=int, required=True)
+    p_replay.add_argument("--field", choices=utils.MATRIX_FIELDS, default="complex", help="field used by the audit run")
+
+    p_recheck = sub.add_parser("recheck", help="re-run archived samples through the checkers (and mpmath if installed)")
+    p_recheck.add_argument("--dir", required=True, help="artifact directory written by audit --artifacts")
+    p_recheck.add_argument("--theorem", choices=sorted(audits.SAMPLERS), default=None)
+    p_recheck.add_argument("--dps", type=int, default=artifacts.HP_DPS, help="decimal digits for the high-precision check")
+    p_recheck.add_argument("--float-only", action="store_true", help="skip the mpmath check")
+    return parser
+
+def audit_plan(args, parser):
+    """{定理: 要审计的 n 列表}; 低于 audits.MIN_N 的 n 逐个警告后跳过, 全部被跳过时报错退出"""
+    theorems = sorted(audits.SAMPLERS) if args.theorem == "all" else [args.theorem]
+    plan = {}
+    for theorem in theorems:
+        for n in args.n:
+            if n < audits.MIN_N[theorem]:
+                print(f"audit_cli: warning: skipping n={n} for {theorem} (needs n >= {audits.MIN_N[theorem]})",
+                      file=sys.stderr)
+        n_values = [n for n in args.n if n >= audits.MIN_N[theorem]]
+        if n_values: plan[theorem] = n_values
+    if not plan: parser.error("no dimension in --n is large enough for the selected theorem(s)")
+    return plan
+
+def cmd_audit(args, stream, plan):
+    seed = audits.new_run_seed() if args.seed is None else args.seed
+    writer = None
+    if args.format == "csv":
+        # csv 里 stages 整体写成一个 JSON 字符串
+        writer = csv.DictWriter(stream, fieldnames=FIELDS + (["stages"] if args.stages else []))
+        writer.writeheader()
+
+    store = None
+    if args.artifacts is not None:
+        store = artifacts.ArtifactStore(args.artifacts, args.top_k, args.max_failures)
+
+    total_failures = 0
+    try:
+        for theorem, n_values in plan.items():
+            results = None
+            if args.results is not None:
+                results = result_sink.create_columns(os.path.join(args.results, theorem), theorem, seed,
+                                                     len(n_values) * args.samples, args.field)
+            for record in audits.run_range(theorem, n_values, args.samples, seed, args.workers, store, results,
+                                           args.stages, args.field):
+                total_failures += record["failures"]
+                if writer is None:
+                    stream.write(json.dumps(record) + "\n")
+                else:
+                    if "stages" in record: record["stages"] = json.dumps(record["stages"])
+                    writer.writerow(record)
+                stream.flush()
+            if results is not None: result_sink.finish(results, len(n_values) * args.samples)
+    finally:
+        if store is not None: store.close()
+    return 1 if total_failures else 0
+
+def cmd_replay(args, stream):
+    passed, violation, slack, params, values = audits.replay_sample(args.theorem, args.n, args.seed, args.index, args.field)
+    record = {"theorem": args.theorem, "n": args.n, "seed": args.seed, "index": args.index, "field": args.field,
+              "passed": bool(passed), "violation": float(violation), "slack": float(slack), **params}
+    for name, value in zip(("sum", "lhs", "rhs"), values):
+        record[name] = None if np.isnan(value) else float(value)
+    stream.write(json.dumps(record) + "\n")
+    return 0 if passed else 1
+
+def cmd_recheck(args, stream):
+    """逐个重新检验存档样本; 有高精度结论时以它为准, 任一样本失败则返回 1"""
+    any_failed = False
+    for rec, arrays in artifacts.load_artifacts(args.dir, args.theorem):
+        result = artifacts.recheck(rec, arrays, not args.float_only, args.dps)
+        verdict = result["float_passed"] if result["hp_passed"] is None else result["hp_passed"]
+        any_failed = any_failed or not verdict
+        out = {k: rec[k] for k in ("theorem", "n", "seed", "index", "kind", "slack")}
+        out.update(rec["params"])
+        out.update(result)
+        stream.write(json.dumps(out) + "\n")
+    return 1 if any_failed else 0
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command == "replay":
+        return cmd_replay(args, sys.stdout)
+    if args.command == "recheck":
+        return cmd_recheck(args, sys.stdout)
+    plan = audit_plan(args, parser)
+    if args.out == "-":
+        return cmd_audit(args, sys.stdout, plan)
+    with open(args.out, "w", newline="") as f:
+        return cmd_audit(args, f, plan)
+
+if __name__ == "__main__":
+    sys.exit(main())
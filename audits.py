@@ -0,0 +1,394 @@
+# 文件名: audits.py
+# 无界面的批量审计: 复刻各 Tab 的 massive 循环, 只依赖 numpy 与 matrix_utils
+# (不导入 tkinter / ttkbootstrap / matplotlib, 可在无显示器的计算节点上运行)
+import time
+import heapq
+import numpy as np
+
+import matrix_utils as utils
+from result_sink import ResultSink
+
+# bounds 审计每批生成的矩阵个数; 也是 bounds 随机流的分块大小 (见 bounds_block), 改动它会改变样本
+BOUNDS_BATCH = 500
+
+# 每个样本的随机数都来自 utils.sample_rng(seed, 定理编号, n, 样本序号):
+# 先抽参数 (窗口 / (m, k)), 再把同一个 Generator 交给 checker 生成矩阵.
+# bounds 例外: 每 BOUNDS_BATCH 个样本共用一个 Generator, 一次向量化抽出整块的窗口和矩阵,
+# 样本 i 是第 i // BOUNDS_BATCH 块的第 i % BOUNDS_BATCH 个 (重放只需重新生成这一块).
+# 下面的 sample_* 返回 (passed, violation, slack, params, values), 也用于单样本重放;
+# slack 越小越接近违背 (失败时为负), 用于挑选险例存档;
+# values = (sum, lhs, rhs): 被检验的量及其下界 / 上界, 没有的为 NaN (写入逐样本结果列)
+# field ("complex" / "real", 见 utils.MATRIX_FIELDS) 决定随机矩阵的数域; weighted / lemma 的地狱模式输入本来就是实数, 不受影响
+
+# Lemma 3.1 的残差阈值 (与 check_lemma_polynomial 一致)
+LEMMA_TOL = 1e-4
+
+def bounds_slack(val, lb, ub):
+    return min(val - lb, ub - val)
+
+def weighted_slack(sum_mu, lhs, rhs):
+    # check_weighted_theorem 在退化窗口 (U_l 或 L_{r+1} 为 0) 直接返回全 0, 不参与险例排序
+    if sum_mu == 0 and lhs == 0 and rhs == 0: return np.inf
+    return min(sum_mu - lhs, rhs - sum_mu)
+
+def hierarchy_slack(cum_left, cum_right):
+    # 末端两条曲线应相等 (差值恒约为 0), 所以只在末端之前取最小差值; 末端不相等时记为负的末端差
+    diff = cum_left - cum_right
+    if abs(diff[-1]) >= 1e-7: return -abs(diff[-1])
+    return np.min(diff[:-1]) if len(diff) > 1 else np.inf
+
+def lemma_slack(res):
+    return LEMMA_TOL - res
+
+# 迹恒等式窗口 (bounds 的 [1, n-1], weighted 的 [0, n-2]): slack 恒为 0, 通过时不算险例
+IDENTITY_WINDOWS = {"bounds": utils.trace_windows, "weighted": utils.weighted_trace_windows}
+
+def near_miss_slack(theorem, n, params, passed, slack):
+    """险例排序用的 slack: 通过的迹恒等式窗口记为 inf (不进入候选), 其余不变"""
+    identity = IDENTITY_WINDOWS.get(theorem)
+    if passed and identity is not None and identity(n, params["l"], params["r"]): return np.inf
+    return slack
+
+def sample_bounds(n, rng, field="complex"):
+    """Theorem 1.4: 随机抽一个窗口 (给定 Generator 的单样本形式); 审计中的 bounds 样本来自 bounds_block, 重放见 replay_bounds"""
+    l = int(rng.integers(1, n))
+    r = int(rng.integers(l, n))
+    return bounds_sample_result(n, l, r, utils.generate_hermitian(n, rng, field))
+
+def bounds_sample_result(n, l, r, A):
+    passed, val, lb, ub = utils.check_bounds_theorem(n, l, r, A=A)
+    viol = 0.0 if passed else max(lb - val, val - ub)
+    return passed, viol, bounds_slack(val, lb, ub), {"l": l, "r": r}, (val, lb, ub)
+
+def sample_weighted(n, rng, field="complex"):
+    """Theorem 2.2: 地狱模式, 随机抽一个窗口 (同 WeightedTab.run_audit)"""
+    limit = n - 1
+    l = int(rng.integers(0, limit))
+    r = int(rng.integers(l, limit))
+    passed, sum_mu, lhs, rhs, viol = utils.check_weighted_theorem(n, l, r, stress_mode=True, rng=rng)
+    return passed, viol, weighted_slack(sum_mu, lhs, rhs), {"l": l, "r": r}, (sum_mu, lhs, rhs)
+
+def sample_weighted_windows(n, rng, field="complex"):
+    """Theorem 2.2 地狱模式的全部窗口 (WeightedTab 勾选 all windows 时): 输入只生成一次, 一次检验约 n^2/2 个窗口
+    不再先抽窗口, 所以与同序号的 sample_weighted 不是同一组输入; passed 为全部窗口都通过,
+    params / values / slack 记录 slack 最小的窗口 (全部通过时不算迹恒等式窗口 (0, n-2), 其 slack 恒为 0),
+    violation 为各窗口的最大违背, 通过时为 0"""
+    passed, sums, lhss, rhss, slacks = utils.check_weighted_windows(n, stress_mode=True, rng=rng)
+    ls, rs = utils.weighted_windows(n)
+    ok = bool(passed.all())
+    ranked = np.where(utils.weighted_trace_windows(n, ls, rs), np.inf, slacks) if ok else slacks
+    j = int(np.argmin(ranked))
+    viol = 0.0 if ok else max(0.0, -float(slacks[j]))
+    return ok, viol, float(slacks[j]), {"l": int(ls[j]), "r": int(rs[j])}, (sums[j], lhss[j], rhss[j])
+
+def sample_hierarchy(n, rng, field="complex"):
+    """Theorem 4.1: 随机抽 (m, k) (同 HierarchyTab.run_scan)"""
+    m = int(rng.integers(2, n))
+    k = int(rng.integers(1, m))
+    passed, _, cum_left, cum_right, viol = utils.check_hierarchy_theorem(n, m, k, rng, field=field)
+    # 记录最紧的断点处左右两条部分和曲线 (左 >= 右, 没有上界); 末端两者相等, 不计入
+    diff = cum_left - cum_right
+    j = int(np.argmin(diff[:-1])) if len(diff) > 1 else len(diff) - 1
+    values = (cum_left[j], cum_right[j], np.nan)
+    return passed, viol, hierarchy_slack(cum_left, cum_right), {"m": m, "k": k}, values
+
+def sample_hierarchy_pairs(n, rng, field="complex"):
+    """Theorem 4.1 的全部 (m, k) (HierarchyTab 勾选 all pairs 时): 一个矩阵检验 C(n-1, 2) 对
+    不再先抽 (m, k), 所以与同序号的 sample_hierarchy 不是同一个矩阵; 前五项同 sample_hierarchy,
+    记录 slack 最小的一对, 第六项为各对的 violation (按 utils.hierarchy_pairs(n) 的顺序)"""
+    passed, violations, curves = utils.check_hierarchy_pairs(n, rng, field=field)
+    slacks = [hierarchy_slack(cum_left, cum_right) for _, cum_left, cum_right in curves]
+    j = int(np.argmin(slacks))
+    ms, ks = utils.hierarchy_pairs(n)
+    _, cum_left, cum_right = curves[j]
+    diff = cum_left - cum_right
+    i = int(np.argmin(diff[:-1])) if len(diff) > 1 else len(diff) - 1
+    values = (cum_left[i], cum_right[i], np.nan)
+    return bool(passed.all()), float(violations.max()), slacks[j], {"m": int(ms[j]), "k": int(ks[j])}, values, violations
+
+def sample_lemma(n, rng, field="complex"):
+    """Lemma 3.1: 地狱模式; violation 记录的是归一化残差 (同 LemmaTab 的 Max Res)"""
+    passed, _, _, _, _, res = utils.check_lemma_polynomial(n, stress_mode=True, rng=rng)
+    return passed, res, lemma_slack(res), {}, (res, np.nan, LEMMA_TOL)
+
+SAMPLERS = {
+    "bounds": sample_bounds,
+    "weighted": sample_weighted,
+    "hierarchy": sample_hierarchy,
+    "lemma": sample_lemma,
+}
+
+THEOREM_CODES = {name: code for code, name in enumerate(sorted(SAMPLERS))}
+
+def sample_rng(theorem, n, seed, index):
+    return utils.sample_rng(seed, THEOREM_CODES[theorem], n, index)
+
+def draw_lemma_n(seed, index, max_n):
+    """LemmaTab 的审计每个样本随机抽维数 n in [3, max_n], 同样只由 (seed, 序号) 决定"""
+    return int(utils.sample_rng(seed, THEOREM_CODES["lemma"], 0, index).integers(3, max_n + 1))
+
+@utils.staged("generate")
+def bounds_block(n, seed, block, field="complex"):
+    """bounds 的第 block 块样本 (序号 block*BOUNDS_BATCH 起): 一个 Generator 一次抽出整块,
+    返回 ls, rs (长度 BOUNDS_BATCH) 与 (BOUNDS_BATCH, n, n) 矩阵堆栈; 没有逐样本的 Python 开销"""
+    rng = utils.sample_rng(seed, THEOREM_CODES["bounds"], n, block, BOUNDS_BATCH)
+    ls = rng.integers(1, n, size=BOUNDS_BATCH)
+    rs = rng.integers(ls, n)
+    return ls, rs, utils.generate_hermitian_batch(n, BOUNDS_BATCH, rng, field)
+
+def replay_bounds(n, seed, index, field="complex"):
+    """bounds 样本 index = (块, 块内偏移): 重新生成所在的一块, 只检验其中一个"""
+    block, offset = divmod(index, BOUNDS_BATCH)
+    ls, rs, A = bounds_block(n, seed, block, field)
+    return bounds_sample_result(n, int(ls[offset]), int(rs[offset]), A[offset])
+
+def replay_sample(theorem, n, seed, index, field="complex"):
+    """重新生成并检验第 index 个样本 (bounds 为 O(BOUNDS_BATCH), 其余 O(1)), 返回 (passed, violation, slack, params, values)"""
+    if theorem == "bounds": return replay_bounds(n, seed, index, field)
+    return SAMPLERS[theorem](n, sample_rng(theorem, n, seed, index), field)
+
+# ==========================================
+# 险例候选: 热循环里只记 (slack, 序号)
+# ==========================================
+class CandidatePool:
+    """有界候选集: slack 最小的 max_failures 个失败样本 + top_k 个通过样本 (slack 为 inf 的通过样本不收, 见 near_miss_slack)
+    堆里只存 (-slack, 序号), 每个样本的开销是一次比较; 矩阵等数据在存档时按种子重新生成"""
+    def __init__(self, top_k, max_failures):
+        self.top_k = top_k
+        self.max_failures = max_failures
+        self.failed = []
+        self.near = []
+
+    def offer(self, index, passed, slack):
+        heap, cap = (self.near, self.top_k) if passed else (self.failed, self.max_failures)
+        if cap <= 0 or (passed and not np.isfinite(slack)): return
+        item = (-float(slack), int(index))
+        if len(heap) < cap: heapq.heappush(heap, item)
+        elif item > heap[0]: heapq.heapreplace(heap, item)
+
+    def offer_batch(self, start, passed, slacks):
+        """批量版本: 先用 argpartition 在每批里挑出候选, 再逐个入堆"""
+        for idx, cap in ((np.flatnonzero(~passed), self.max_failures), (np.flatnonzero(passed), self.top_k)):
+            if len(idx) > cap: idx = idx[np.argpartition(slacks[idx], cap - 1)[:cap]] if cap > 0 else idx[:0]
+            for j in idx: self.offer(start + j, passed[j], slacks[j])
+
+    def merge(self, other):
+        for index, passed, slack in other.items(): self.offer(index, passed, slack)
+        return self
+
+    def items(self):
+        """按 slack 升序返回 [(index, passed, slack), ...]"""
+        out = [(i, False, -s) for s, i in self.failed] + [(i, True, -s) for s, i in self.near]
+        return sorted(out, key=lambda c: (c[2], c[0]))
+
+def audit_samples(theorem, n, seed, start, count, pool=None, sink=None, field="complex"):
+    """检验样本 start .. start+count-1, 返回 (failures, max_violation)
+    lemma 的 max_violation 是全部样本的最大残差, 其余定理只统计失败样本
+    pool: 可选的 CandidatePool, 记录失败样本和险例; sink: 可选的 ResultSink, 逐样本写一行"""
+    failures = 0
+    max_violation = 0.0
+    sampler = SAMPLERS[theorem]
+    for i in range(start, start + count):
+        passed, viol, slack, params, values = sampler(n, sample_rng(theorem, n, seed, i), field)
+        if not passed: failures += 1
+        if not passed or theorem == "lemma": max_violation = max(max_violation, viol)
+        if pool is not None: pool.offer(i, passed, near_miss_slack(theorem, n, params, passed, slack))
+        if sink is not None: sink.append(n, params, i, passed, viol, slack, values)
+    return failures, max_violation
+
+def bounds_blocks(n, seed, lo, hi, field="complex"):
+    """逐块产出样本 lo .. hi-1 的 (起始序号, ls, rs, A); lo / hi 不必与块对齐, 块内多余的样本直接丢弃"""
+    for block in range(lo // BOUNDS_BATCH, (hi - 1) // BOUNDS_BATCH + 1):
+        base = block * BOUNDS_BATCH
+        a, z = max(lo, base) - base, min(hi, base + BOUNDS_BATCH) - base
+        ls, rs, A = bounds_block(n, seed, block, field)
+        yield base + a, ls[a:z], rs[a:z], A[a:z]
+
+def bounds_batch(n, seed, lo, hi, field="complex"):
+    """bounds 样本 lo .. hi-1 的批量检验 (样本来自 bounds_block, 与 replay_bounds 一致),
+    返回 (ls, rs, passed, sums, lbs, ubs, slacks)"""
+    parts = []
+    for _, ls, rs, A in bounds_blocks(n, seed, lo, hi, field):
+        parts.append((ls, rs) + utils.check_bounds_theorem_batch(n, len(ls), windows=(ls, rs), A=A))
+    return tuple(np.concatenate(col) for col in zip(*parts))
+
+def write_bounds_batch(sink, n, lo, batch):
+    ls, rs, passed, sums, lbs, ubs, slacks = batch
+    sink.append_batch(n=n, l=ls, r=rs, index=np.arange(lo, lo + len(ls)), sum=sums, lhs=lbs, rhs=ubs,
+                      slack=slacks, violation=np.where(passed, 0.0, -slacks), passed=passed)
+
+def audit_bounds_batched(n, seed, start, count, pool=None, sink=None, field="complex"):
+    """bounds 的批量版本, 样本与 replay_bounds 相同; 返回 (failures, max_violation)"""
+    failures = 0
+    max_violation = 0.0
+    for lo in range(start, start + count, BOUNDS_BATCH):
+        hi = min(lo + BOUNDS_BATCH, start + count)
+        batch = bounds_batch(n, seed, lo, hi, field)
+        passed, slacks = batch[2], batch[6]
+        failures += int(np.count_nonzero(~passed))
+        if not passed.all(): max_violation = max(max_violation, float(-np.min(slacks)))
+        if pool is not None:
+            ranked = np.where(passed & utils.trace_windows(n, batch[0], batch[1]), np.inf, slacks)
+            pool.offer_batch(lo, passed, ranked)
+        if sink is not None: write_bounds_batch(sink, n, lo, batch)
+    return failures, max_violation
+
+def run_samples(theorem, n, seed, start, count, pool=None, sink=None, field="complex"):
+    """返回 (failures, max_violation); bounds 走批量路径"""
+    if theorem == "bounds": return audit_bounds_batched(n, seed, start, count, pool, sink, field)
+    return audit_samples(theorem, n, seed, start, count, pool, sink, field)
+
+# ==========================================
+# 存档数据: 按种子重新生成样本的输入
+# ==========================================
+# 与 sample_* 的随机数消耗顺序完全一致, 返回 (params, arrays)
+
+def capture_bounds(n, rng, field="complex"):
+    l = int(rng.integers(1, n))
+    r = int(rng.integers(l, n))
+    return {"l": l, "r": r}, {"A": utils.generate_hermitian(n, rng, field)}
+
+def capture_weighted(n, rng, field="complex"):
+    limit = n - 1
+    l = int(rng.integers(0, limit))
+    r = int(rng.integers(l, limit))
+    lambdas, u = utils.stress_weighted_inputs(n, rng)
+    return {"l": l, "r": r}, {"lambdas": lambdas, "u": u}
+
+def capture_hierarchy(n, rng, field="complex"):
+    m = int(rng.integers(2, n))
+    k = int(rng.integers(1, m))
+    return {"m": m, "k": k}, {"A": utils.generate_hermitian(n, rng, field)}
+
+def capture_lemma(n, rng, field="complex"):
+    lambdas, u = utils.stress_lemma_inputs(n, rng)
+    return {}, {"lambdas": lambdas, "u": u}
+
+CAPTURES = {
+    "bounds": capture_bounds,
+    "weighted": capture_weighted,
+    "hierarchy": capture_hierarchy,
+    "lemma": capture_lemma,
+}
+
+def capture_bounds_block(n, seed, index, field="complex"):
+    block, offset = divmod(index, BOUNDS_BATCH)
+    ls, rs, A = bounds_block(n, seed, block, field)
+    return {"l": int(ls[offset]), "r": int(rs[offset])}, {"A": A[offset]}
+
+def capture_sample(theorem, n, seed, index, field="complex"):
+    if theorem == "bounds": return capture_bounds_block(n, seed, index, field)
+    return CAPTURES[theorem](n, sample_rng(theorem, n, seed, index), field)
+
+# 各定理允许的最小维数 (与各 Tab 的 Spinbox 下限一致)
+MIN_N = {"bounds": 3, "weighted": 4, "hierarchy": 4, "lemma": 3}
+
+# 每个分片的样本数; 每个样本的种子只由 (seed, 定理, n, 序号) 决定,
+# 因此分片划分和 worker 数都不影响结果 (逐位一致)
+SHARD_SIZE = 1000
+
+def shards(samples, shard_size=SHARD_SIZE):
+    """把 samples 切成固定大小的分片, 返回 [(start, count), ...]"""
+    return [(start, min(shard_size, samples - start)) for start in range(0, samples, shard_size)]
+
+def run_shard(theorem, n, seed, start, count, keep=None, rows=None, stages=False, field="complex"):
+    """进程池的工作函数, 必须是模块级函数才能被 pickle
+    keep = (top_k, max_failures) 时同时返回本分片的 CandidatePool, 否则为 None
+    rows = (结果目录, 起始行) 时把逐样本记录写进预分配列的对应行段 (各分片互不重叠)
+    stages 为真时同时返回本分片各 checker 阶段的 utils.StageProfile, 否则为 None"""
+    pool = None if keep is None else CandidatePool(*keep)
+    sink = None if rows is None else ResultSink(*rows)
+    profile = utils.StageProfile() if stages else None
+    try:
+        with utils.collect_stages(profile):
+            failures, max_violation = run_samples(theorem, n, seed, start, count, pool, sink, field)
+    finally:
+        if sink is not None: sink.close()
+    return failures, max_violation, pool, profile
+
+def merge_shards(results):
+    """合并分片聚合量: 失败数相加, 最大违背取最大, 候选集取并后截断, 阶段计时相加, 与合并顺序无关"""
+    failures = sum(r[0] for r in results)
+    max_violation = max((r[1] for r in results), default=0.0)
+    pools = [r[2] for r in results if r[2] is not None]
+    pool = pools[0] if pools else None
+    for other in pools[1:]: pool.merge(other)
+    profiles = [r[3] for r in results if r[3] is not None]
+    profile = profiles[0] if profiles else None
+    for other in profiles[1:]: profile.merge(other)
+    return failures, max_violation, pool, profile
+
+def make_record(theorem, n, samples, seed, failures, max_violation, seconds, profile=None, field="complex"):
+    """profile 不为 None 时附上各阶段的耗时汇总 (utils.StageProfile.summary)"""
+    record = {
+        "theorem": theorem,
+        "n": n,
+        "samples": samples,
+        "failures": failures,
+        "max_violation": float(max_violation),
+        "seconds": seconds,
+        "samples_per_sec": samples / seconds if seconds > 0 else float("inf"),
+        "seed": seed,
+        "field": field,
+    }
+    if profile is not None: record["stages"] = profile.summary()
+    return record
+
+def check_n(theorem, n):
+    if n < MIN_N[theorem]:
+        raise ValueError(f"{theorem} audit needs n >= {MIN_N[theorem]}, got {n}")
+
+def new_run_seed():
+    """未指定种子时取一个新的熵值, 并写进结果记录以便复现"""
+    return int(np.random.SeedSequence().entropy)
+
+def store_keep(store):
+    return None if store is None else (store.top_k, store.max_failures)
+
+def shard_rows(results, row0, start):
+    return None if results is None else (results, row0 + start)
+
+def run_audit(theorem, n, samples, seed=None, store=None, results=None, row0=0, stages=False, field="complex"):
+    """对单个 n 在当前进程里运行一次审计, 返回一条结果记录 (dict)
+    store: 可选的 artifacts.ArtifactStore, 失败样本和险例交给它在后台线程写盘
+    results: 可选的结果目录 (result_sink.create_columns), 样本 i 写在第 row0 + i 行
+    stages: 为真时记录各 checker 阶段的耗时直方图, 汇总写进记录的 stages 字段
+    field: 随机矩阵的数域 (utils.MATRIX_FIELDS), 同一种子下两种数域的样本不同, 所以写进记录"""
+    check_n(theorem, n)
+    utils.check_field(field)
+    if seed is None: seed = new_run_seed()
+    t0 = time.perf_counter()
+    keep = store_keep(store)
+    parts = [run_shard(theorem, n, seed, start, count, keep, shard_rows(results, row0, start), stages, field)
+             for start, count in shards(samples)]
+    failures, max_violation, candidates, profile = merge_shards(parts)
+    seconds = time.perf_counter() - t0
+    if store is not None: store.submit(theorem, n, seed, candidates, field)
+    return make_record(theorem, n, samples, seed, failures, max_violation, seconds, profile, field)
+
+def run_range(theorem, n_values, samples, seed=None, workers=1, store=None, results=None, stages=False, field="complex"):
+    """逐个 n 运行审计, 每完成一个 n 就产出一条记录 (生成器, 便于流式输出)
+    workers > 1 时把全部 (n, 分片) 一次性提交到进程池; 结果与 workers 无关
+    results: 可选的结果目录, 需预分配 len(n_values) * samples 行, 第 j 个 n 占 [j*samples, (j+1)*samples)"""
+    for n in n_values: check_n(theorem, n)
+    utils.check_field(field)
+    if seed is None: seed = new_run_seed()
+    if workers <= 1:
+        for j, n in enumerate(n_values):
+            yield run_audit(theorem, n, samples, seed, store, results, j * samples, stages, field)
+        return
+
+    from concurrent.futures import ProcessPoolExecutor
+    keep = store_keep(store)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        t0 = time.perf_counter()
+        pending = [(n, [pool.submit(run_shard, theorem, n, seed, start, count, keep,
+                                    shard_rows(results, j * samples, start), stages, field)
+                        for start, count in shards(samples)])
+                   for j, n in enumerate(n_values)]
+        for n, futures in pending:
+            failures, max_violation, candidates, profile = merge_shards([f.result() for f in futures])
+            if store is not None: store.submit(theorem, n, seed, candidates, field)
+            t1 = time.perf_counter()
+            yield make_record(theorem, n, samples, seed, failures, max_violation, t1 - t0, profile, field)
+            t0 = t1
@@ -0,0 +1,69 @@
+# 文件名: banner_cache.py
+# 定理 LaTeX 横幅的磁盘缓存: 第一次用 matplotlib mathtext 渲染成 PNG, 之后直接用 Tk PhotoImage 显示,
+# 不再创建 Figure / FigureCanvasTkAgg. 缓存键包含文字、字体设置、尺寸、DPI、底色,
+# 以及 theorem_texts.py 和 matplotlib 的版本, 任何一项变化都会换一个文件名 (旧文件随之删除)
+import os
+import sys
+import hashlib
+from functools import lru_cache
+
+import theorem_texts
+
+# 全部图形共用的学术风格字体 (main.setup_matplotlib 也用这一组)
+FONT_SETTINGS = {"mathtext.fontset": "cm", "font.family": "serif"}
+
+FACECOLOR = "#f8f9fa"
+
+@lru_cache(maxsize=None)
+def _file_digest(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+@lru_cache(maxsize=None)
+def _matplotlib_version():
+    # 已导入时直接取版本号; 否则只读包元数据, 缓存命中时不导入 matplotlib
+    if "matplotlib" in sys.modules: return sys.modules["matplotlib"].__version__
+    try:
+        from importlib.metadata import version
+        return version("matplotlib")
+    except Exception:
+        return "unknown"
+
+def banner_key(latex, figsize, dpi, fontsize, facecolor):
+    parts = [latex, repr(sorted(FONT_SETTINGS.items())), repr(tuple(figsize)), str(dpi), str(fontsize), facecolor,
+             _file_digest(theorem_texts.__file__), _matplotlib_version()]
+    return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()[:16]
+
+def render_banner(path, latex, figsize, dpi, fontsize, facecolor):
+    """用 Agg 渲染到 PNG (不经过 Tk 画布); 先写临时文件再改名"""
+    import matplotlib
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    with matplotlib.rc_context(FONT_SETTINGS):
+        fig = Figure(figsize=figsize, dpi=dpi)
+        fig.patch.set_facecolor(facecolor)
+        ax = fig.add_subplot(111)
+        ax.axis('off')
+        ax.text(0.5, 0.5, latex, fontsize=fontsize, ha='center', va='center')
+        FigureCanvasAgg(fig)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            fig.savefig(f, format="png", dpi=dpi, facecolor=facecolor)
+    os.replace(tmp, path)
+
+def banner_file(cache_dir, name, latex, figsize=(8, 1), dpi=100, fontsize=13, facecolor=FACECOLOR):
+    """返回横幅 PNG 的路径, 未命中时渲染; 同名的旧版本文件一并删除"""
+    os.makedirs(cache_dir, exist_ok=True)
+    key = banner_key(latex, figsize, dpi, fontsize, facecolor)
+    path = os.path.join(cache_dir, f"{name}_{key}.png")
+    if not os.path.exists(path):
+        render_banner(path, latex, figsize, dpi, fontsize, facecolor)
+        for old in os.listdir(cache_dir):
+            if old.startswith(name + "_") and old.endswith(".png") and old != os.path.basename(path):
+                os.remove(os.path.join(cache_dir, old))
+    return path
+
+def banner_photo(master, cache_dir, name, latex, **kwargs):
+    """横幅的 Tk PhotoImage (调用方需保留引用, 否则图片会被回收)"""
+    import tkinter
+    return tkinter.PhotoImage(master=master, file=banner_file(cache_dir, name, latex, **kwargs))
@@ -0,0 +1,321 @@
+# 文件名: benchmarks.py
+# matrix_utils 各 checker 的基准测试: 按 n、(m, k)、批大小和模式扫描, 记录每秒样本数、
+# 峰值内存 (tracemalloc) 以及 LAPACK 与 Python 的耗时占比, 结果存为 JSON; compare 对比两次结果并标出退化, 例如:
+#   python benchmarks.py run --out bench_before.json
+#   python benchmarks.py run --n 6,8,10 --cases hierarchy,get_sub_eigs --out bench_after.json
+#   python benchmarks.py compare bench_before.json bench_after.json --threshold 0.1
+#   python benchmarks.py run --field real --out bench_real.json   (与复数域结果 compare 即得实对称的加速比)
+import sys
+import json
+import time
+import platform
+import argparse
+import tracemalloc
+from contextlib import contextmanager
+import numpy as np
+
+import matrix_utils as utils
+
+BENCH_SEED = 2601
+
+# ==========================================
+# 测试用例
+# ==========================================
+# 每个构造函数返回 [(params, call, samples)]: call() 做一次测量, 处理 samples 个样本;
+# 输入 (矩阵等) 在构造时生成, 不计入被测函数的耗时
+# 随机矩阵的数域取 opts.field (--field), 同一用例的参数键不变, 两个数域的结果文件可以直接 compare
+def case_generate_hermitian(n, opts, rng):
+    return [({}, lambda: utils.generate_hermitian(n, rng, opts.field), 1)]
+
+def case_get_sub_eigs(n, opts, rng):
+    A = utils.generate_hermitian(n, rng, opts.field)
+    return [({"size": s}, lambda s=s: utils.get_sub_eigs(A, s), 1) for s in range(2, n)]
+
+def case_bounds(n, opts, rng):
+    l, r = 1, n - 1
+    return [({"l": l, "r": r}, lambda: utils.check_bounds_theorem(n, l, r, rng, field=opts.field), 1)]
+
+def case_bounds_batch(n, opts, rng):
+    return [({"batch": b}, lambda b=b: utils.check_bounds_theorem_batch(n, b, rng=rng, field=opts.field), b)
+            for b in opts.batch]
+
+def case_bounds_screen(n, opts, rng):
+    # 单精度筛查 + float64 回退, 与 bounds_batch 同批大小对比
+    return [({"batch": b}, lambda b=b: utils.check_bounds_theorem_batch(n, b, rng=rng, screen=True, field=opts.field), b)
+            for b in opts.batch]
+
+def case_householder_compress(n, opts, rng):
+    # 普通模式 weighted / lemma 的压缩核, 批量 (A, u) 对
+    out = []
+    for b in opts.batch:
+        A = utils.generate_hermitian_batch(n, b, rng, opts.field)
+        u = np.stack([utils.random_unit_vector(n, rng, opts.field) for _ in range(b)])
+        out.append(({"batch": b}, lambda A=A, u=u: utils.householder_compress(A, u), b))
+    return out
+
+def case_compress(n, opts, rng):
+    # 单个 (A, u) 上两条压缩路径对比, 用于确定 utils.COMPRESS_HOUSEHOLDER_MIN_N
+    A = utils.generate_hermitian(n, rng, opts.field)
+    u = utils.random_unit_vector(n, rng, opts.field)
+    return [({"method": "qr"}, lambda: utils.qr_compress(A, u), 1),
+            ({"method": "householder"}, lambda: utils.householder_compress(A, u), 1)]
+
+def case_hierarchy(n, opts, rng):
+    pairs = [(m, k) for m in range(2, n) for k in range(1, m)] if opts.mk is None else opts.mk
+    return [({"m": m, "k": k}, lambda m=m, k=k: utils.check_hierarchy_theorem(n, m, k, rng, field=opts.field), 1)
+            for m, k in pairs if k < m < n]
+
+def case_hierarchy_pairs(n, opts, rng):
+    # 一个矩阵的全部 (m, k), 各阶子矩阵谱共用; samples 记为对数, 与 hierarchy 的单对吞吐可直接比较
+    pairs = len(utils.hierarchy_pairs(n)[0])
+    return [({}, lambda: utils.check_hierarchy_pairs(n, rng, field=opts.field), pairs)]
+
+def case_weighted(n, opts, rng):
+    l, r = 0, n - 2
+    return [({"mode": mode}, lambda stress=stress: utils.check_weighted_theorem(n, l, r, stress, rng=rng, field=opts.field), 1)
+            for mode, stress in (("normal", False), ("stress", True))]
+
+def case_weighted_windows(n, opts, rng):
+    # 地狱模式一个样本的全部 (l, r) 窗口; samples 记为窗口数, 与 weighted 的单窗口吞吐可直接比较
+    windows = len(utils.weighted_windows(n)[0])
+    return [({"mode": "stress"}, lambda: utils.check_weighted_windows(n, True, rng=rng, field=opts.field), windows)]
+
+def case_lemma(n, opts, rng):
+    return [({"mode": mode}, lambda stress=stress: utils.check_lemma_polynomial(n, stress, rng=rng, field=opts.field), 1)
+            for mode, stress in (("normal", False), ("stress", True))]
+
+def case_poly_func(n, opts, rng):
+    # 与 LemmaTab 画图时相同: 在 400 个点上求 P(x)
+    _, _, _, poly_func, x_rng, _ = utils.check_lemma_polynomial(n, rng=rng, field=opts.field)
+    x = np.linspace(x_rng[0], x_rng[1], 400)
+    return [({"points": len(x)}, lambda: poly_func(x), 1)]
+
+CASES = {
+    "generate_hermitian": case_generate_hermitian,
+    "get_sub_eigs": case_get_sub_eigs,
+    "bounds": case_bounds,
+    "bounds_batch": case_bounds_batch,
+    "bounds_screen": case_bounds_screen,
+    "householder_compress": case_householder_compress,
+    "compress": case_compress,
+    "hierarchy": case_hierarchy,
+    "hierarchy_pairs": case_hierarchy_pairs,
+    "weighted": case_weighted,
+    "weighted_windows": case_weighted_windows,
+    "lemma": case_lemma,
+    "poly_func": case_poly_func,
+}
+
+# ==========================================
+# 测量
+# ==========================================
+# LAPACK 驱动的入口: 测量期间临时包一层计时, 其余时间都算作 Python/numpy 逐元素开销
+LAPACK_ENTRIES = [
+    ("numpy.linalg", ("eigvalsh", "eigh", "eigvals", "eig", "qr", "svd", "solve")),
+    ("scipy.linalg", ("eigvalsh", "eigh", "qr", "svd", "null_space")),
+]
+
+@contextmanager
+def lapack_timer():
+    """产出一个 [秒] 列表, 累计被包住的 LAPACK 入口的耗时 (嵌套调用只计最外层)"""
+    import importlib
+    total, depth, saved = [0.0], [0], []
+
+    def wrap(fn):
+        def timed(*args, **kwargs):
+            if depth[0]: return fn(*args, **kwargs)
+            depth[0] += 1
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                total[0] += time.perf_counter() - t0
+                depth[0] -= 1
+        return timed
+
+    for module_name, names in LAPACK_ENTRIES:
+        try:
+            module = importlib.import_module(module_name)
+        except ImportError:
+            continue
+        for name in names:
+            if hasattr(module, name):
+                saved.append((module, name, getattr(module, name)))
+                setattr(module, name, wrap(getattr(module, name)))
+    try:
+        yield total
+    finally:
+        for module, name, fn in saved: setattr(module, name, fn)
+
+def time_call(call, min_time, repeat):
+    """每轮至少跑 min_time 秒, 取 repeat 轮里每次调用的最短时间"""
+    call()
+    best = np.inf
+    for _ in range(repeat):
+        loops, t0 = 0, time.perf_counter()
+        while True:
+            call()
+            loops += 1
+            elapsed = time.perf_counter() - t0
+            if elapsed >= min_time: break
+        best = min(best, elapsed / loops)
+    return best
+
+def lapack_split(call, loops):
+    with lapack_timer() as total:
+        t0 = time.perf_counter()
+        for _ in range(loops): call()
+        elapsed = time.perf_counter() - t0
+    return total[0] / loops, elapsed / loops
+
+def peak_memory(call):
+    """单次调用期间 tracemalloc 记录到的峰值 (字节); numpy 数组的内存也计在内"""
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        call()
+        return tracemalloc.get_traced_memory()[1] - base
+    finally:
+        tracemalloc.stop()
+
+def measure(call, samples, min_time, repeat):
+    sec = time_call(call, min_time, repeat)
+    # 计时包装本身有开销, 占比单独跑一遍, 按比例折算到 sec 上
+    loops = max(1, int(min_time / sec)) if sec > 0 else 1
+    lapack, wall = lapack_split(call, loops)
+    frac = min(lapack / wall, 1.0) if wall > 0 else 0.0
+    return {
+        "sec_per_call": sec,
+        "samples_per_sec": samples / sec if sec > 0 else float("inf"),
+        "lapack_frac": frac,
+        "lapack_sec": sec * frac,
+        "python_sec": sec * (1.0 - frac),
+        "peak_bytes": peak_memory(call),
+    }
+
+def result_key(result):
+    return (result["case"], result["n"], json.dumps(result["params"], sort_keys=True))
+
+def environment():
+    env = {"python": platform.python_version(), "machine": platform.machine(), "platform": platform.platform(),
+           "numpy": np.__version__}
+    try:
+        import scipy
+        env["scipy"] = scipy.__version__
+    except ImportError:
+        pass
+    return env
+
+def run_benchmarks(cases, n_values, opts, stream=None):
+    results = []
+    for name in cases:
+        for n in n_values:
+            rng = np.random.default_rng([BENCH_SEED, n])
+            for params, call, samples in CASES[name](n, opts, rng):
+                record = {"case": name, "n": n, "params": params, "samples": samples}
+                record.update(measure(call, samples, opts.min_time, opts.repeat))
+                results.append(record)
+                if stream is not None:
+                    stream.write(format_result(record) + "\n")
+                    stream.flush()
+    return results
+
+def format_result(rec):
+    params = " ".join(f"{k}={v}" for k, v in rec["params"].items())
+    return (f"{rec['case']:<18} n={rec['n']:<4} {params:<16} {rec['samples_per_sec']:>12,.1f} samples/s  "
+            f"LAPACK {100 * rec['lapack_frac']:5.1f}%  peak {rec['peak_bytes'] / 1024:,.0f} KiB")
+
+# ==========================================
+# 对比
+# ==========================================
+def compare_results(old, new, threshold=0.1, mem_threshold=0.25):
+    """按 (用例, n, 参数) 配对; 新结果慢于旧结果超过 threshold (或峰值内存多出 mem_threshold) 记为退化
+    返回 (rows, missing), rows 为 (key, 旧, 新, 耗时比, 内存比, 是否退化)"""
+    old_map = {result_key(r): r for r in old["results"]}
+    new_map = {result_key(r): r for r in new["results"]}
+    rows = []
+    for key, b in new_map.items():
+        a = old_map.get(key)
+        if a is None: continue
+        ratio = b["sec_per_call"] / a["sec_per_call"] if a["sec_per_call"] > 0 else 1.0
+        mem = b["peak_bytes"] / a["peak_bytes"] if a["peak_bytes"] > 0 else 1.0
+        rows.append((key, a, b, ratio, mem, ratio > 1 + threshold or mem > 1 + mem_threshold))
+    missing = sorted(set(old_map) ^ set(new_map))
+    return rows, missing
+
+# ==========================================
+# 命令行
+# ==========================================
+def parse_list(text, cast=int):
+    """'4:10' (含两端), '8', 或 '5,7,9'"""
+    if ":" in text:
+        lo, hi = text.split(":")
+        return list(range(int(lo), int(hi) + 1))
+    return [cast(v) for v in text.split(",")]
+
+def parse_mk(text):
+    """'all' 或 '4:2,5:3' 这样的 m:k 列表"""
+    if text == "all": return None
+    return [tuple(int(v) for v in pair.split(":")) for pair in text.split(",")]
+
+def parse_cases(text):
+    names = sorted(CASES) if text == "all" else text.split(",")
+    for name in names:
+        if name not in CASES: raise argparse.ArgumentTypeError(f"unknown case: {name}")
+    return names
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="benchmarks", description="Benchmarks of the matrix_utils checkers.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_run = sub.add_parser("run", help="run the benchmark sweep and save the results as JSON")
+    p_run.add_argument("--cases", type=parse_cases, default=sorted(CASES), help=f"comma list or 'all' ({', '.join(CASES)})")
+    p_run.add_argument("--n", type=parse_list, default=[4, 6, 8, 10], help="dimensions, e.g. 4:10 or 6,8,12")
+    p_run.add_argument("--mk", type=parse_mk, default=None, help="hierarchy (m, k) pairs, e.g. 4:2,5:3 (default: all k < m < n)")
+    p_run.add_argument("--batch", type=parse_list, default=[1, 100, 1000], help="batch sizes for bounds_batch / bounds_screen / householder_compress")
+    p_run.add_argument("--field", choices=utils.MATRIX_FIELDS, default="complex", help="field of the random matrices")
+    p_run.add_argument("--min-time", type=float, default=0.2, help="seconds per timing round")
+    p_run.add_argument("--repeat", type=int, default=3, help="timing rounds (the fastest is kept)")
+    p_run.add_argument("--label", default="", help="free-form label stored in the JSON")
+    p_run.add_argument("--out", default="benchmark.json", help="output JSON file")
+
+    p_cmp = sub.add_parser("compare", help="compare two benchmark JSON files and flag regressions")
+    p_cmp.add_argument("old")
+    p_cmp.add_argument("new")
+    p_cmp.add_argument("--threshold", type=float, default=0.1, help="allowed slowdown (0.1 = 10%%)")
+    p_cmp.add_argument("--mem-threshold", type=float, default=0.25, help="allowed peak-memory growth")
+    return parser
+
+def cmd_run(args, stream):
+    results = run_benchmarks(args.cases, args.n, args, stream)
+    data = {"label": args.label, "created": time.strftime("%Y-%m-%dT%H:%M:%S"), "environment": environment(),
+            "settings": {"min_time": args.min_time, "repeat": args.repeat, "field": args.field}, "results": results}
+    with open(args.out, "w") as f:
+        json.dump(data, f, indent=1)
+    stream.write(f"[Output] {len(results)} results saved to: {args.out}\n")
+    return 0
+
+def cmd_compare(args, stream):
+    """打印每个配对用例的耗时比与内存比; 有退化时返回 1"""
+    with open(args.old) as f: old = json.load(f)
+    with open(args.new) as f: new = json.load(f)
+    rows, missing = compare_results(old, new, args.threshold, args.mem_threshold)
+    for (case, n, params), a, b, ratio, mem, regressed in sorted(rows, key=lambda row: row[0]):
+        flag = "REGRESSION" if regressed else ("faster" if ratio < 1 - args.threshold else "")
+        stream.write(f"{case:<18} n={n:<4} {params:<24} {a['samples_per_sec']:>12,.1f} -> {b['samples_per_sec']:>12,.1f} samples/s"
+                     f"  x{1 / ratio:5.2f}  mem x{mem:5.2f}  {flag}\n")
+    for case, n, params in missing:
+        stream.write(f"{case:<18} n={n:<4} {params:<24} only in one file\n")
+    n_bad = sum(row[-1] for row in rows)
+    stream.write(f"{len(rows)} compared, {n_bad} regressions\n")
+    return 1 if n_bad else 0
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.command == "compare":
+        return cmd_compare(args, sys.stdout)
+    return cmd_run(args, sys.stdout)
+
+if __name__ == "__main__":
+    sys.exit(main())
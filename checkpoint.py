@@ -0,0 +1,26 @@
+# 文件名: checkpoint.py
+# 长时间范围扫描的断点文件: 记录扫描参数, 下一个待检验的 (n, 样本序号) 和已有的聚合量.
+# 每个样本的随机数只由 (seed, 定理, n, 序号) 决定, 所以从断点继续与不中断运行的结果逐位一致
+import os
+import json
+
+# 每检验这么多个样本写一次断点 (另外每个 n 结束时也写一次)
+CHECKPOINT_EVERY = 1000
+
+def save_state(path, state):
+    """原子写入: 先写临时文件再 os.replace, 中途崩溃不会留下半个断点文件"""
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f, indent=1)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+def load_state(path):
+    """读取断点; 没有断点文件时返回 None"""
+    if not os.path.exists(path): return None
+    with open(path) as f:
+        return json.load(f)
+
+def clear_state(path):
+    if os.path.exists(path): os.remove(path)
@@ -1,11 +1,9 @@
 # 文件名: main.py
+import time
+T_START = time.perf_counter() # 启动计时起点 (见 MainApp.report_startup)
+
 import sys
 import os
-import matplotlib.pyplot as plt
-
-# 设置学术风格字体
-plt.rcParams['mathtext.fontset'] = 'cm' 
-plt.rcParams['font.family'] = 'serif'
 
 try:
     import ttkbootstrap as ttk
@@ -14,12 +12,26 @@ except ImportError:
     import tkinter as ttk
     from tkinter.constants import *
 
+import banner_cache
+
 # 导入所有 Tab
 from tab_bounds import BoundsTab
 from tab_weighted import WeightedTab
 from tab_hierarchy import HierarchyTab
 from tab_lemma import LemmaTab # <--- 必须导入
 
+T_IMPORTS = time.perf_counter()
+
+_MPL_READY = False
+
+def setup_matplotlib():
+    """matplotlib 延迟到第一个 Tab 构建时才导入; 设置学术风格字体"""
+    global _MPL_READY
+    if _MPL_READY: return
+    import matplotlib
+    matplotlib.rcParams.update(banner_cache.FONT_SETTINGS)
+    _MPL_READY = True
+
 # 高分屏适配 (Windows)
 if sys.platform == "win32":
     try:
@@ -58,16 +70,43 @@ class MainApp:
         self.notebook.pack(fill=BOTH, expand=True, padx=10, pady=10)
 
         # --- 这里是关键修正：必须把 4 个 Tab 都加进去 ---
-        self.tab1 = BoundsTab(self.notebook, self.output_dir)
-        self.tab_weighted = WeightedTab(self.notebook, self.output_dir)
-        self.tab2 = HierarchyTab(self.notebook, self.output_dir)
-        self.tab_lemma = LemmaTab(self.notebook, self.output_dir) # <--- 补上这一行！
+        # 这里只创建空白页签, 界面在第一次切到该 Tab 时才构建 (on_tab_changed)
+        self.tab1 = BoundsTab(self.notebook, self.output_dir, self.set_status)
+        self.tab_weighted = WeightedTab(self.notebook, self.output_dir, self.set_status)
+        self.tab2 = HierarchyTab(self.notebook, self.output_dir, self.set_status)
+        self.tab_lemma = LemmaTab(self.notebook, self.output_dir, self.set_status) # <--- 补上这一行！
+        self.tabs = [self.tab1, self.tab_weighted, self.tab2, self.tab_lemma]
 
         # Status Bar
         self.status = ttk.Label(root, text=f" System Ready. Output: {self.output_dir}", 
                                 bootstyle="secondary", relief="sunken", anchor=W)
         self.status.pack(side=BOTTOM, fill=X)
 
+        # 启动计时: 窗口先显示出来, 再构建当前 Tab
+        self.timings = [("imports", T_IMPORTS - T_START), ("window", time.perf_counter() - T_START)]
+        self.notebook.bind("<<NotebookTabChanged>>", self.on_tab_changed)
+        self.root.after_idle(self.report_startup)
+
+    def set_status(self, text):
+        # 只在主线程调用 (后台任务经各自的队列转回主线程)
+        self.status.config(text=f" {text}")
+
+    def on_tab_changed(self, event=None):
+        tab = self.tabs[self.notebook.index("current")]
+        if tab.built: return
+        t0 = time.perf_counter()
+        setup_matplotlib()
+        tab.build()
+        self.timings.append((f"build {type(tab).__name__}", time.perf_counter() - t0))
+
+    def report_startup(self):
+        """第一个 Tab 构建完成后打印启动耗时 (累计时间点 + 各 Tab 的构建时间)"""
+        self.on_tab_changed()
+        self.timings.append(("ready", time.perf_counter() - T_START))
+        report = ", ".join(f"{name} {sec * 1000:.0f} ms" for name, sec in self.timings)
+        print(f"[Startup] {report}")
+        self.status.config(text=f" System Ready ({self.timings[-1][1]:.2f} s). Output: {self.output_dir}")
+
 if __name__ == "__main__":
     app = ttk.Window(themename="cosmo") 
     MainApp(app)
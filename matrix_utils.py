@@ -1,37 +1,408 @@
 # 文件名: matrix_utils.py
 import numpy as np
 import itertools
-from scipy.special import comb
-from scipy.linalg import null_space, eigvalsh, qr, eigh
+import math
+import time
+import threading
+from math import comb
+from functools import lru_cache, wraps
+from contextlib import contextmanager
+# scipy.linalg 只在稠密对照路径和普通模式里用到, 在函数内延迟导入 (启动时不加载 scipy)
 
-def generate_hermitian(n):
-    """生成随机厄米矩阵"""
-    A = np.random.randn(n, n) + 1j * np.random.randn(n, n)
+# rng=None 时共用的模块级 Generator: 每次调用都 default_rng() 要重新取熵 (约 18 us), 单次检验会慢 30% 以上.
+# Generator 内部带锁, GUI 的后台线程可以共用; 审计与重放都显式传入 sample_rng, 不经过这里
+_DEFAULT_RNG = np.random.default_rng()
+
+def as_rng(rng=None):
+    """None 时用模块级的 _DEFAULT_RNG; 所有随机数都从 Generator 取, 不碰 np.random 的全局状态"""
+    return _DEFAULT_RNG if rng is None else rng
+
+def sample_rng(run_seed, *key):
+    """第 key 个样本专属的 Generator, 由 (run_seed, key) 直接派生:
+    任意单个样本都能 O(1) 重放, 不必重跑整条随机流; key 通常是 (定理编号, n, 样本序号)"""
+    return np.random.Generator(np.random.PCG64(np.random.SeedSequence(run_seed, spawn_key=key)))
+
+# ==========================================
+# 分阶段计时 (可选)
+# ==========================================
+# checker 用 with stage("eigvalsh"): ... 或 @staged("bounds") 标出阶段: 未开启时只是一次全局计数判断;
+# 在 collect_stages(profile) 里调用时, 本线程内各阶段的耗时记进 profile 的对数分桶直方图
+class StageProfile:
+    """每个阶段一条记录: 次数, 总耗时, 最大值, 以及从 1e-7 s 到 100 s、每十倍 4 个桶的直方图"""
+    MIN_LOG10 = -7
+    BINS_PER_DECADE = 4
+    N_BINS = 9 * BINS_PER_DECADE
+
+    def __init__(self):
+        self.stages = {} # 阶段名 -> [count, total, max, bins]
+
+    def record(self, stage, seconds):
+        entry = self.stages.get(stage)
+        if entry is None:
+            entry = self.stages[stage] = [0, 0.0, 0.0, [0] * self.N_BINS]
+        entry[0] += 1
+        entry[1] += seconds
+        if seconds > entry[2]: entry[2] = seconds
+        b = int((math.log10(seconds) - self.MIN_LOG10) * self.BINS_PER_DECADE) if seconds > 0 else 0
+        entry[3][min(max(b, 0), self.N_BINS - 1)] += 1
+
+    def merge(self, other):
+        for stage, (count, total, peak, bins) in other.stages.items():
+            entry = self.stages.setdefault(stage, [0, 0.0, 0.0, [0] * self.N_BINS])
+            entry[0] += count
+            entry[1] += total
+            entry[2] = max(entry[2], peak)
+            entry[3] = [a + b for a, b in zip(entry[3], bins)]
+        return self
+
+    def bin_edges(self):
+        return [10.0 ** (self.MIN_LOG10 + j / self.BINS_PER_DECADE) for j in range(self.N_BINS + 1)]
+
+    def quantile(self, stage, q):
+        """由直方图估计分位数 (取所在桶的上沿, 不超过实测最大值)"""
+        count, _, peak, bins = self.stages[stage]
+        edges = self.bin_edges()
+        seen = 0
+        for j, c in enumerate(bins):
+            seen += c
+            if seen >= q * count: return min(edges[j + 1], peak)
+        return peak
+
+    def summary(self):
+        """按总耗时降序的 [dict], share 为占全部已计时阶段的比例"""
+        grand = sum(entry[1] for entry in self.stages.values())
+        rows = []
+        for stage, (count, total, peak, _) in self.stages.items():
+            rows.append({"stage": stage, "count": count, "total": total, "share": total / grand if grand > 0 else 0.0,
+                         "mean": total / count, "p50": self.quantile(stage, 0.5), "p90": self.quantile(stage, 0.9),
+                         "p99": self.quantile(stage, 0.99), "max": peak})
+        return sorted(rows, key=lambda row: -row["total"])
+
+    def to_dict(self):
+        """JSON 可序列化的完整数据 (写进导出文件和断点)"""
+        return {"bin_edges": self.bin_edges(), "summary": self.summary(),
+                "stages": {stage: list(entry) for stage, entry in self.stages.items()}}
+
+    @classmethod
+    def from_dict(cls, data):
+        profile = cls()
+        for stage, (count, total, peak, bins) in data["stages"].items():
+            profile.stages[stage] = [count, total, peak, list(bins)]
+        return profile
+
+class _StageLocal(threading.local):
+    profile = None
+
+_STAGE_LOCAL = _StageLocal()
+_STAGE_LOCK = threading.Lock()
+_stages_active = 0 # 各线程里正在记录的 collect_stages 个数; 为 0 时连 thread-local 都不读
+
+def stage_profile():
+    """当前线程正在记录的 StageProfile, 未开启时为 None"""
+    if not _stages_active: return None
+    return _STAGE_LOCAL.profile
+
+class _Stage:
+    __slots__ = ("profile", "name", "t0")
+
+    def __init__(self, profile, name):
+        self.profile, self.name = profile, name
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.profile.record(self.name, time.perf_counter() - self.t0)
+
+class _NoStage:
+    def __enter__(self): pass
+    def __exit__(self, *exc): pass
+
+_NO_STAGE = _NoStage()
+
+def stage(name):
+    """with stage(name): 块内耗时记进当前线程的 StageProfile; 未开启时返回共用的空上下文, 不计时"""
+    profile = stage_profile()
+    return _NO_STAGE if profile is None else _Stage(profile, name)
+
+def staged(name):
+    """装饰器版的 stage: 整个函数计为一个阶段 (只用在不再调用其他阶段的函数上, 以免重复计时)"""
+    def decorate(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name): return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+@contextmanager
+def collect_stages(profile):
+    """在本线程内把各 checker 的阶段耗时记进 profile; profile 为 None 时什么也不做"""
+    global _stages_active
+    if profile is None:
+        yield None
+        return
+    previous = _STAGE_LOCAL.profile
+    _STAGE_LOCAL.profile = profile
+    with _STAGE_LOCK: _stages_active += 1
+    try:
+        yield profile
+    finally:
+        with _STAGE_LOCK: _stages_active -= 1
+        _STAGE_LOCAL.profile = previous
+
+# 随机矩阵 / 投影向量所在的数域: "complex" 为厄米矩阵 (默认), "real" 为实对称矩阵,
+# 后者的 LAPACK 求解走实数例程, 不付复数运算的代价
+MATRIX_FIELDS = ("complex", "real")
+
+def check_field(field):
+    if field not in MATRIX_FIELDS:
+        raise ValueError(f"unknown field: {field!r} (expected one of {MATRIX_FIELDS})")
+
+def generate_hermitian(n, rng=None, field="complex"):
+    """生成随机厄米矩阵 (field="real" 时为实对称矩阵)"""
+    check_field(field)
+    rng = as_rng(rng)
+    if field == "real":
+        A = rng.standard_normal((n, n))
+        return A + A.T
+    A = rng.standard_normal((n, n)) + 1j * rng.standard_normal((n, n))
     return A + A.conj().T
 
-def get_sub_eigs(mat, size):
-    """获取所有子矩阵特征值"""
-    idx = list(range(mat.shape[0]))
-    vals = []
-    for subset in itertools.combinations(idx, size):
-        sub_A = mat[np.ix_(subset, subset)]
-        vals.extend(np.linalg.eigvalsh(sub_A))
-    return np.sort(np.array(vals))[::-1]
+def generate_hermitian_batch(n, trials, rng=None, field="complex"):
+    """一次生成 trials 个随机厄米矩阵, 形状 (T, n, n)
+    rng 也可以是长度为 T 的 Generator 列表, 此时第 t 个矩阵与 generate_hermitian(n, rng[t], field) 相同"""
+    check_field(field)
+    if isinstance(rng, (list, tuple)):
+        return np.stack([generate_hermitian(n, g, field) for g in rng])
+    rng = as_rng(rng)
+    if field == "real":
+        A = rng.standard_normal((trials, n, n))
+        return A + A.swapaxes(-1, -2)
+    A = rng.standard_normal((trials, n, n)) + 1j * rng.standard_normal((trials, n, n))
+    return A + A.conj().swapaxes(-1, -2)
+
+def random_unit_vector(n, rng, field="complex"):
+    """普通模式的投影向量: 单位球面上均匀分布 (复数或实数)"""
+    u = rng.standard_normal(n) if field == "real" else rng.standard_normal(n) + 1j * rng.standard_normal(n)
+    return u / np.linalg.norm(u)
+
+# get_sub_eigs 每批求解的子矩阵个数, 决定峰值内存 (约 chunk * size^2 * 16 字节)
+SUB_EIGS_CHUNK = 4096
+
+# 全部 (m, k) 扫描每个矩阵要用到 1..n-1 的每个阶数, 缓存要装得下同一 n 的全部下标表
+@lru_cache(maxsize=32)
+def _subset_index_table(n, size):
+    """全部 size 元子集的下标表, 形状 (C(n, size), size), 按 (n, size) LRU 缓存"""
+    count = comb(n, size)
+    flat = np.fromiter(itertools.chain.from_iterable(itertools.combinations(range(n), size)),
+                       dtype=np.min_scalar_type(max(n - 1, 0)), count=count * size)
+    table = flat.reshape(count, size)
+    table.setflags(write=False)
+    return table
+
+def get_sub_eigs(mat, size, chunk_size=None):
+    """获取所有子矩阵特征值 (降序)
+    按 chunk_size 个子集分块取出 (chunk, size, size) 堆栈, 每块一次批量 eigvalsh"""
+    if chunk_size is None: chunk_size = SUB_EIGS_CHUNK
+    table = _subset_index_table(mat.shape[0], size)
+    vals = np.empty((len(table), size))
+    with stage("sub_eigvalsh"):
+        for start in range(0, len(table), chunk_size):
+            idx = table[start:start + chunk_size]
+            vals[start:start + len(idx)] = np.linalg.eigvalsh(mat[idx[:, :, None], idx[:, None, :]])
+    with stage("sort"):
+        vals = vals.ravel()
+        vals.sort()
+    return vals[::-1]
+
+@lru_cache(maxsize=None)
+def _deletion_index(n):
+    """删去第 k 行/列后保留的下标表, 形状 (n, n-1)"""
+    mask = ~np.eye(n, dtype=bool)
+    keep = np.broadcast_to(np.arange(n), (n, n))[mask].reshape(n, n - 1)
+    keep.setflags(write=False)
+    return keep
+
+def get_deleted_sub_matrices(A):
+    """一次性取出全部 n 个删一行一列的主子矩阵, 形状 (..., n, n-1, n-1)"""
+    keep = _deletion_index(A.shape[-1])
+    return A[..., keep[:, :, None], keep[:, None, :]]
+
+def get_deleted_sub_eigs(A):
+    """全部 n 个 (n-1) 阶主子矩阵的特征值 (每行降序), 形状 (..., n, n-1)
+    整个堆栈只调用一次批量 eigvalsh"""
+    with stage("gather"): sub = get_deleted_sub_matrices(A)
+    with stage("sub_eigvalsh"): return np.linalg.eigvalsh(sub)[..., ::-1]
+
+# ==========================================
+# 混合精度筛查: 单精度求特征值 + 严格误差界
+# ==========================================
+# 只作为内部接口 (check_bounds_theorem_batch(screen=True)) 与 benchmarks 的 bounds_screen 保留:
+# 实测比 float64 批量路径慢 2.5-4 倍, 在基准测试显示单精度更快之前不对 GUI / 命令行开放
+def screened_eigvalsh(M):
+    """在 complex64 / float32 下批量求特征值, 并给出每个矩阵的严格误差界
+    Kahan 残差界: X 可逆, R = M X - X diag(mu) 时, 两边都升序排列有 |lambda_i - mu_i| <= ||R||_2 / sigma_min(X).
+    ||R||_2 用 ||R||_F 上界, sigma_min(X) 用 1 - ||X^H X - I||_F 下界; R 与 Gram 矩阵在 float64 下计算,
+    矩阵乘法自身的舍入按 (n+2) eps 的标准界保守地加进去
+    返回 (mu, err): mu 升序 (float64), err 形状 M.shape[:-2]; X 严重不正交时 err 为 inf"""
+    n = M.shape[-1]
+    mu, X = np.linalg.eigh(M.astype(np.complex64 if np.iscomplexobj(M) else np.float32))
+    X = X.astype(M.dtype)
+    mu = mu.astype(float)
+    R = M @ X - X * mu[..., None, :]
+    G = X.conj().swapaxes(-1, -2) @ X
+    G[..., np.arange(n), np.arange(n)] -= 1
+    eps = np.finfo(float).eps
+    x_norm = np.linalg.norm(X, axis=(-2, -1))
+    m_scale = np.linalg.norm(M, axis=(-2, -1)) + np.max(np.abs(mu), axis=-1)
+    r_norm = np.linalg.norm(R, axis=(-2, -1)) + 2 * (n + 2) * eps * m_scale * x_norm
+    g_norm = np.linalg.norm(G, axis=(-2, -1)) + 2 * (n + 2) * eps * x_norm ** 2
+    with np.errstate(divide="ignore"):
+        err = np.where(g_norm < 1, r_norm / (1 - g_norm), np.inf)
+    return mu, err
+
+# ==========================================
+# 久期方程 (Secular Equation)
+# ==========================================
+def secular_roots(poles, weights, max_iter=100):
+    """求 f(x) = sum_i w_i / (d_i - x) = 0 的全部 q-1 个根 (可带前导批维度)
+    poles: (..., q) 升序; weights: (..., q) 非负且每行和为正
+    第 a 个根必落在 [d_a, d_{a+1}] 内 (交错定理). 每步用两极点有理模型
+    c + s/(d_a - x) + S/(d_{a+1} - x) 拟合 f 及其导数并解二次方程, 落在区间外时退回二分;
+    区间用计数函数 N(x) = #{d_i < x} - 1 + [f(x) > 0] (= 小于 x 的根的个数) 收缩,
+    因此重根 (d_a = d_{a+1}) 与零权重 (根恰好落在极点上) 都无需特殊处理
+    返回 (..., q-1) 升序的根"""
+    poles = np.asarray(poles, dtype=float)
+    weights = np.asarray(weights, dtype=float)
+    q = poles.shape[-1]
+    batch_shape = poles.shape[:-1]
+    P = poles.reshape(-1, q)
+    W = weights.reshape(-1, q)
+
+    # 每个 (矩阵, 根序号) 展开成一行, 只对尚未收敛的行继续迭代
+    rows = np.repeat(np.arange(len(P)), q - 1)
+    target = np.tile(np.arange(q - 1), len(P))
+    lo = P[rows, target]
+    hi = P[rows, target + 1]
+    x = 0.5 * (lo + hi)
+    active = np.nonzero(hi > lo)[0]
+    x[hi <= lo] = lo[hi <= lo]
+
+    eps = np.finfo(float).eps
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        for _ in range(max_iter):
+            if len(active) == 0: break
+            r, a, xa = rows[active], target[active], x[active]
+            k = np.arange(len(active))
+            delta = P[r] - xa[:, None]
+            w = W[r]
+            inv = 1.0 / delta
+            inv[w == 0] = 0.0
+            terms = w * inv
+            # 导数在左侧 (d_0..d_a) 与右侧极点上各自的和, 用前缀和一次取出
+            cum_p = np.cumsum(terms * inv, axis=1)
+            f, fp = terms.sum(axis=1), cum_p[:, -1]
+            psi_p = cum_p[k, a]
+            phi_p = fp - psi_p
+
+            below = np.count_nonzero(delta < 0, axis=1) - 1 + (f > 0)
+            go_up = below <= a
+            lo[active] = la = np.where(go_up, xa, lo[active])
+            hi[active] = ha = np.where(go_up, hi[active], xa)
+
+            # 两极点模型的根: c*eta^2 - B*eta + C = 0, eta = x_new - x
+            da, db = delta[k, a], delta[k, a + 1]
+            s_l, s_r = psi_p * da * da, phi_p * db * db
+            c = f - s_l / da - s_r / db
+            B = c * (da + db) + s_l + s_r
+            C = da * db * f
+            disc = np.sqrt(np.maximum(B * B - 4 * c * C, 0.0))
+            qq = 0.5 * (B + np.where(B >= 0, disc, -disc))
+            eta1, eta2 = C / qq, qq / c
+            y1, y2 = xa + eta1, xa + eta2
+            in1 = (y1 >= la) & (y1 <= ha)
+            in2 = (y2 >= la) & (y2 <= ha)
+            x_new = np.where(in1, y1, np.where(in2, y2, 0.5 * (la + ha)))
+
+            tol = 2 * eps * np.maximum(np.abs(la), np.abs(ha))
+            done = (ha - la <= tol) | (np.abs(x_new - xa) <= tol)
+            x[active] = x_new
+            active = active[~done]
+    return np.clip(x, lo, hi).reshape(batch_shape + (q - 1,))
+
+# Hell Mode 中 n 达到该值才默认走久期方程; numpy 下小矩阵的逐元素开销大于 LAPACK,
+# 实测交叉点约在 n = 700 附近. GUI 的维数上限 (30) 远低于此, 久期路径只在命令行的大 n 审计里用到
+PROJECTION_SECULAR_MIN_N = 700
+
+def projection_spectrum(lambdas, weights):
+    """Lemma 3.1: diag(lambdas) 压缩到 u 的正交补上的 n-1 个特征值 (降序)
+    即 sum_i w_i / (lambda_i - x) = 0 的根, weights = |u_i|^2; 直接解久期方程, O(n^2)
+    lambdas 需降序, 可带前导批维度"""
+    with stage("secular"): roots = secular_roots(lambdas[..., ::-1], weights[..., ::-1])
+    return roots[..., ::-1]
+
+def projection_spectrum_dense(lambdas, u):
+    """projection_spectrum 的稠密对照实现: 显式构造正交补基后 eigvalsh, O(n^3)"""
+    from scipy.linalg import null_space, eigvalsh, qr
+    with stage("null_space"):
+        try:
+            V = null_space(u.reshape(1, -1))
+        except:
+            Q, _ = qr(u.reshape(-1, 1), mode='full')
+            V = Q[:, 1:]
+    # V^T diag(lambdas) V: 对角矩阵左乘改成按行缩放, 不构造稠密的 diag
+    with stage("eigvalsh"): return np.sort(eigvalsh((V.T * lambdas) @ V))[::-1]
+
+# 普通模式压缩 A 到 u⊥ 时, n 达到该值才用 Householder 秩 2 更新; 更小的 n 上 numpy 逐元素运算的开销
+# 大于 qr + 两次小矩阵乘法 (n = 5..8 实测约 52 us 对 35 us), GUI 的普通模式 (n <= 30) 都走 QR
+COMPRESS_HOUSEHOLDER_MIN_N = 32
+
+def compress_to_complement(A, u):
+    """单个 (A, u) 的 V^H A V, 按 n 选择 qr_compress 或 householder_compress"""
+    if A.shape[-1] >= COMPRESS_HOUSEHOLDER_MIN_N: return householder_compress(A, u)
+    return qr_compress(A, u)
+
+def qr_compress(A, u):
+    """V 取 qr(u, mode='full') 的后 n-1 列, 显式算 V^H A V (单个矩阵)"""
+    from scipy.linalg import qr
+    Q, _ = qr(u.reshape(-1, 1), mode='full')
+    V = Q[:, 1:]
+    return V.conj().T @ A @ V
+
+def householder_compress(A, u):
+    """A 压缩到 u 的正交补上, 即 V^H A V (V 为 u⊥ 的一组正交基), 形状 (..., n-1, n-1)
+    Householder 反射 H = I - tau v v^H 把 u 映到 -phase(u_1)|u| e_1, H 的后 n-1 列就是 V;
+    H A H = A - v w^H - w v^H (p = tau A v, w = p - (tau/2)(v^H p) v) 是秩 2 更新, 每个矩阵 O(n^2), 取右下块即可.
+    A: (..., n, n) 厄米矩阵, u: (..., n) 非零向量, 前导批维度逐对广播"""
+    u = np.asarray(u)
+    u1 = u[..., 0]
+    mag = np.abs(u1)
+    phase = np.where(mag > 0, u1 / np.where(mag > 0, mag, 1), 1)
+    v = u.astype(np.result_type(A, u), copy=True)
+    v[..., 0] += phase * np.linalg.norm(u, axis=-1)
+    tau = 2 / np.sum(np.abs(v) ** 2, axis=-1)
+    p = tau[..., None] * np.squeeze(A @ v[..., None], -1)
+    K = 0.5 * tau * np.real(np.sum(v.conj() * p, axis=-1))
+    w = p - K[..., None] * v
+    vt, wt = v[..., 1:], w[..., 1:]
+    return A[..., 1:, 1:] - vt[..., :, None] * wt.conj()[..., None, :] - wt[..., :, None] * vt.conj()[..., None, :]
 
 # ==========================================
 # Theorem 1.4: Aggregate Bounds
 # ==========================================
-def check_bounds_theorem(n, l, r):
-    A = generate_hermitian(n)
-    lambdas = np.linalg.eigvalsh(A)[::-1]
-    
-    sub_eigs_sum = 0.0
-    idx_list = list(range(n))
-    for k in range(n):
-        keep = [i for i in idx_list if i != k]
-        w = np.linalg.eigvalsh(A[np.ix_(keep, keep)])[::-1]
-        sub_eigs_sum += np.sum(w[l-1:r])
-    
+def check_bounds_theorem(n, l, r, rng=None, A=None, field="complex"):
+    """A 不为 None 时直接检验给定矩阵 (用于重新检验存档的样本); field 见 MATRIX_FIELDS"""
+    if A is None:
+        with stage("generate"): A = generate_hermitian(n, rng, field)
+    with stage("eigvalsh"): lambdas = np.linalg.eigvalsh(A)[::-1]
+    sub_eigs = get_deleted_sub_eigs(A)
+    return bounds_single_window(n, l, r, lambdas, sub_eigs)
+
+@staged("bounds")
+def bounds_single_window(n, l, r, lambdas, sub_eigs):
+    """由 A 的谱 (降序) 与删一行一列子矩阵的谱检验窗口 [l, r], 返回值同 check_bounds_theorem"""
+    sub_eigs_sum = np.sum(sub_eigs[:, l-1:r])
+
     term_lam = np.sum(lambdas[l-1:r])
     term_lam_next = np.sum(lambdas[l:r+1])
     
@@ -41,21 +412,188 @@ def check_bounds_theorem(n, l, r):
     passed = (lb - 1e-7 <= sub_eigs_sum <= ub + 1e-7)
     return passed, sub_eigs_sum, lb, ub
 
+def bounds_spectra(A):
+    """批量求 A 的特征值 (降序) 与全部删一行一列子矩阵的特征值, 形状 (T, n) 与 (T, n, n-1)"""
+    with stage("eigvalsh"): lambdas = np.linalg.eigvalsh(A)[:, ::-1]
+    return lambdas, get_deleted_sub_eigs(A)
+
+def screened_bounds_spectra(A):
+    """bounds_spectra 的单精度版本, 另返回每个矩阵的 slack 误差界 (宽度为 1 的窗口; 宽度 w 时乘以 w)
+    窗口和 sum_i sum_j mu_j(A_i) 的误差至多 w * sum_i err_i; 下界 / 上界都是 n * w 个 lambda 的组合, 误差至多 n * w * err_A"""
+    with stage("eigh_screen"): lambdas, err_A = screened_eigvalsh(A)
+    with stage("gather"): sub = get_deleted_sub_matrices(A)
+    with stage("sub_eigh_screen"): sub_eigs, err_sub = screened_eigvalsh(sub)
+    return lambdas[:, ::-1], sub_eigs[..., ::-1], err_sub.sum(axis=-1) + A.shape[-1] * err_A
+
+def screen_escalate(slacks, bound):
+    """筛查的判定: 误差界内最坏的 slack 仍 >= 0 才算确定通过.
+    float64 路径的容差是 -1e-7, 多出的 1e-7 余量远大于 float64 自身的舍入, 所以确定通过的样本在 float64 下也必然通过;
+    其余样本 (可能失败, 或离边界太近, 或误差界为 inf) 返回 True, 需要回到 float64 重算"""
+    return ~(slacks - bound >= 0)
+
+def trace_windows(n, ls, rs):
+    """窗口 [1, n-1] 上窗口和与两个界都等于 (n-1) tr(A) (迹恒等式), slack 精确为 0;
+    单精度误差界在这里永远判不出确定通过, 所以筛查直接把它记为 0, 不回退"""
+    return (np.asarray(ls) == 1) & (np.asarray(rs) == n - 1)
+
+def check_bounds_theorem_batch(n, trials, windows=None, rng=None, screen=False, field="complex", A=None):
+    """Theorem 1.4 的多矩阵向量化版本
+    windows: None 时每个矩阵随机抽一个 (l, r); 也可给定 (l, r) 或两个长度为 T 的数组
+    rng 为 Generator 列表时, 第 t 个样本先抽窗口再生成矩阵, 与用 rng[t] 单独抽样完全一致
+    A 不为 None 时直接检验给定的 (T, n, n) 矩阵堆栈, 不再生成
+    返回 passed, sums, lbs, ubs, slacks (均为长度 T 的数组)
+    screen 为真时先在单精度下检验, 只把不能确定通过的样本用 float64 重算 (passed 与 float64 路径一致),
+    此时多返回一个布尔数组 escalated, 标出重算过的样本; 确定通过的样本其余数值是单精度结果"""
+    if windows is None and isinstance(rng, (list, tuple)):
+        ls = np.empty(trials, dtype=int)
+        rs = np.empty(trials, dtype=int)
+        for t, g in enumerate(rng):
+            ls[t] = g.integers(1, n)
+            rs[t] = g.integers(ls[t], n)
+    elif windows is None:
+        rng = as_rng(rng)
+        ls = rng.integers(1, n, size=trials)
+        rs = rng.integers(ls, n)
+    else:
+        ls, rs = windows
+    ls = np.broadcast_to(np.asarray(ls), (trials,))
+    rs = np.broadcast_to(np.asarray(rs), (trials,))
+
+    if A is None:
+        with stage("generate"): A = generate_hermitian_batch(n, trials, rng, field)
+    if not screen:
+        passed, sums, lbs, ubs, slacks = bounds_window_values(n, *bounds_spectra(A), ls, rs)
+        return passed, sums, lbs, ubs, slacks
+
+    lambdas, sub_eigs, err = screened_bounds_spectra(A)
+    passed, sums, lbs, ubs, slacks = bounds_window_values(n, lambdas, sub_eigs, ls, rs)
+    exact = trace_windows(n, ls, rs)
+    slacks[exact] = 0.0
+    passed[exact] = True
+    escalated = screen_escalate(slacks, np.where(exact, 0.0, (rs - ls + 1) * err))
+    idx = np.flatnonzero(escalated)
+    if len(idx):
+        values = bounds_window_values(n, *bounds_spectra(A[idx]), ls[idx], rs[idx])
+        for arr, value in zip((passed, sums, lbs, ubs, slacks), values): arr[idx] = value
+    return passed, sums, lbs, ubs, slacks, escalated
+
+@staged("bounds")
+def bounds_window_values(n, lambdas, sub_eigs, ls, rs):
+    """由谱计算每个样本自己窗口 [ls, rs] 的 passed, sums, lbs, ubs, slacks"""
+    trials = len(lambdas)
+    rows = np.arange(trials)
+    col_sums = sub_eigs.sum(axis=1)
+
+    # 前缀和: 任意窗口的求和变成两次查表
+    zeros = np.zeros((trials, 1))
+    cum_sub = np.concatenate([zeros, np.cumsum(col_sums, axis=1)], axis=1)
+    cum_lam = np.concatenate([zeros, np.cumsum(lambdas, axis=1)], axis=1)
+
+    sums = cum_sub[rows, rs] - cum_sub[rows, ls - 1]
+    term_lam = cum_lam[rows, rs] - cum_lam[rows, ls - 1]
+    term_lam_next = cum_lam[rows, rs + 1] - cum_lam[rows, ls]
+
+    width = rs - ls + 1
+    lbs = width * lambdas[rows, ls - 1] + (n - 1) * term_lam_next
+    ubs = (n - 1) * term_lam + width * lambdas[rows, rs]
+
+    slacks = np.minimum(sums - lbs, ubs - sums)
+    passed = slacks >= -1e-7
+    return passed, sums, lbs, ubs, slacks
+
+@lru_cache(maxsize=None)
+def bounds_windows(n):
+    """Theorem 1.4 的全部合法窗口 1 <= l <= r <= n-1, 返回 (ls, rs) 两个数组"""
+    ls, rs = np.triu_indices(n - 1)
+    ls, rs = ls + 1, rs + 1
+    ls.setflags(write=False)
+    rs.setflags(write=False)
+    return ls, rs
+
+def bounds_window_sweep(lambdas, sub_eigs):
+    """由一个矩阵的谱一次性检验全部 O(n^2) 个窗口 (可带前导批维度)
+    lambdas: (..., n) 降序; sub_eigs: (..., n, n-1), 即 get_deleted_sub_eigs 的输出
+    返回 sums, lbs, ubs, slacks, 形状 (..., n-1, n-1), 下标 [l-1, r-1], 非法窗口 (r < l) 为 NaN"""
+    n = lambdas.shape[-1]
+    zeros = np.zeros(lambdas.shape[:-1] + (1,))
+    cum_sub = np.concatenate([zeros, np.cumsum(sub_eigs.sum(axis=-2), axis=-1)], axis=-1)
+    cum_lam = np.concatenate([zeros, np.cumsum(lambdas, axis=-1)], axis=-1)
+
+    l = np.arange(1, n)[:, None]
+    r = np.arange(1, n)[None, :]
+    width = r - l + 1
+    # 广播后形状 (..., n-1, n-1): 行对应 l, 列对应 r
+    sums = cum_sub[..., None, 1:] - cum_sub[..., :-1, None]
+    term_lam = cum_lam[..., None, 1:-1] - cum_lam[..., :-2, None]
+    term_lam_next = cum_lam[..., None, 2:] - cum_lam[..., 1:-1, None]
+    lbs = width * lambdas[..., :-1, None] + (n - 1) * term_lam_next
+    ubs = (n - 1) * term_lam + width * lambdas[..., None, 1:]
+
+    slacks = np.minimum(sums - lbs, ubs - sums)
+    invalid = width < 1
+    for arr in (sums, lbs, ubs, slacks):
+        arr[..., invalid] = np.nan
+    return sums, lbs, ubs, slacks
+
+@staged("window_sweep")
+def bounds_window_slacks(n, lambdas, sub_eigs):
+    """全部合法窗口的 slack, 形状 (T, W), 列顺序与 bounds_windows(n) 一致"""
+    _, _, _, slack_table = bounds_window_sweep(lambdas, sub_eigs)
+    ls, rs = bounds_windows(n)
+    return slack_table[:, ls - 1, rs - 1]
+
+def check_bounds_windows_batch(n, trials, rng=None, screen=False, field="complex", A=None):
+    """对 trials 个随机矩阵检验全部合法窗口 (A 不为 None 时检验给定的矩阵堆栈)
+    返回 passed, slacks, 形状 (T, W), 列顺序与 bounds_windows(n) 一致
+    screen 为真时同 check_bounds_theorem_batch: 任一窗口不能确定通过的矩阵整行用 float64 重算, 多返回 escalated (长度 T)"""
+    if A is None:
+        with stage("generate"): A = generate_hermitian_batch(n, trials, rng, field)
+    if not screen:
+        slacks = bounds_window_slacks(n, *bounds_spectra(A))
+        return slacks >= -1e-7, slacks
+
+    lambdas, sub_eigs, err = screened_bounds_spectra(A)
+    slacks = bounds_window_slacks(n, lambdas, sub_eigs)
+    ls, rs = bounds_windows(n)
+    exact = trace_windows(n, ls, rs)
+    slacks[:, exact] = 0.0
+    escalated = screen_escalate(slacks, np.where(exact, 0.0, (rs - ls + 1) * err[:, None])).any(axis=1)
+    idx = np.flatnonzero(escalated)
+    if len(idx): slacks[idx] = bounds_window_slacks(n, *bounds_spectra(A[idx]))
+    return slacks >= -1e-7, slacks, escalated
+
 # ==========================================
 # Theorem 4.1: Spectral Hierarchy
 # ==========================================
-def check_hierarchy_theorem(n, m, k):
-    A = generate_hermitian(n)
-    X_m = get_sub_eigs(A, m)
-    X_k = get_sub_eigs(A, k)
-    
-    c_m = int(comb(m-1, k-1))
-    c_k = int(comb(n-k, m-k))
+def weighted_partial_sums(X, c, t):
+    """降序数组 X 的每个元素重复 c 次后, 前 t 项的和 (不展开 np.repeat)"""
+    prefix = np.concatenate([[0.0], np.cumsum(X)])
+    q = np.minimum(t // c, len(X) - 1)
+    return c * prefix[q] + (t - q * c) * X[q]
+
+def weighted_majorization_curves(X_left, c_left, X_right, c_right):
+    """以重数为权重比较两条部分和曲线
+    两条曲线都是分段线性的, 差值只可能在合并后的断点 (以及 t=1) 处取到最小值,
+    因此只在这些点上求值即可, 与展开后逐项 cumsum 完全等价
+    返回断点 t 以及两条曲线在 t 处的部分和"""
+    total = len(X_left) * c_left
+    t = np.union1d(np.arange(c_left, total + 1, c_left), np.arange(c_right, total + 1, c_right))
+    t = np.union1d([1], t)
+    return t, weighted_partial_sums(X_left, c_left, t), weighted_partial_sums(X_right, c_right, t)
+
+def check_hierarchy_theorem(n, m, k, rng=None, A=None, field="complex"):
+    if A is None:
+        with stage("generate"): A = generate_hermitian(n, rng, field)
+    return hierarchy_pair_check(n, m, k, get_sub_eigs(A, m), get_sub_eigs(A, k))
+
+def hierarchy_pair_check(n, m, k, X_m, X_k):
+    """由已算好的 m 阶与 k 阶主子矩阵谱 (降序) 检验一对 (m, k), 返回值同 check_hierarchy_theorem"""
+    c_m = comb(m-1, k-1)
+    c_k = comb(n-k, m-k)
     
-    v_left = np.repeat(X_m, c_m)
-    v_right = np.repeat(X_k, c_k)
+    with stage("partial_sums"): t, cum_left, cum_right = weighted_majorization_curves(X_m, c_m, X_k, c_k)
     
-    diff = np.cumsum(v_left) - np.cumsum(v_right)
+    diff = cum_left - cum_right
     min_diff = np.min(diff)
     
     passed = (min_diff >= -1e-7) and (abs(diff[-1]) < 1e-7)
@@ -64,60 +602,108 @@ def check_hierarchy_theorem(n, m, k):
     if not passed:
         violation = abs(min_diff)
         
-    return passed, v_left, v_right, violation
+    return passed, t, cum_left, cum_right, violation
+
+@lru_cache(maxsize=None)
+def hierarchy_pairs(n):
+    """Theorem 4.1 的全部合法 (m, k): 1 <= k < m <= n-1, 共 C(n-1, 2) 对, 返回 (ms, ks)"""
+    ms, ks = np.tril_indices(n - 1, -1)
+    ms, ks = ms + 1, ks + 1
+    ms.setflags(write=False)
+    ks.setflags(write=False)
+    return ms, ks
+
+def check_hierarchy_pairs(n, rng=None, A=None, field="complex"):
+    """一个矩阵上检验全部 (m, k): 1..n-1 每个阶数的子矩阵谱只算一次, 各对共用
+    (每个阶数约被 n 对用到), 返回 passed, violations (按 hierarchy_pairs(n) 的顺序) 与各对的
+    (t, cum_left, cum_right) 列表"""
+    if A is None:
+        with stage("generate"): A = generate_hermitian(n, rng, field)
+    spectra = {s: get_sub_eigs(A, s) for s in range(1, n)}
+    ms, ks = hierarchy_pairs(n)
+    passed = np.empty(len(ms), dtype=bool)
+    violations = np.empty(len(ms))
+    curves = []
+    for j, (m, k) in enumerate(zip(ms.tolist(), ks.tolist())):
+        passed[j], t, cum_left, cum_right, violations[j] = hierarchy_pair_check(n, m, k, spectra[m], spectra[k])
+        curves.append((t, cum_left, cum_right))
+    return passed, violations, curves
+
+# ==========================================
+# Stress-mode inputs (Theorem 2.2 / Lemma 3.1)
+# ==========================================
+def stress_unit_vector(n, rng):
+    """地狱模式的投影向量: 随机方向, 30% 概率某一分量为 0, 30% 概率为 1e-8"""
+    u = rng.standard_normal(n)
+    rand_val = rng.random()
+    if rand_val < 0.3:
+        # 30% 概率：绝对零
+        u[rng.integers(0, n)] = 0.0
+    elif rand_val < 0.6:
+        # 30% 概率：微小值 (1e-8) - 专门测试数值稳定性
+        u[rng.integers(0, n)] = 1e-8
+    return u / np.linalg.norm(u)
+
+def stress_weighted_inputs(n, rng):
+    """Theorem 2.2 地狱模式 (完全复刻脚本逻辑): 强制重根 + 零/微小权重, 返回 (lambdas 降序, u)"""
+    raw_vals = rng.uniform(-10, 10, n)
+    if rng.random() < 0.5:
+        dup_idx = rng.integers(0, n-2)
+        raw_vals[dup_idx+1] = raw_vals[dup_idx]
+        if n > 3: raw_vals[dup_idx+2] = raw_vals[dup_idx]
+    lambdas = np.sort(raw_vals)[::-1]
+    return lambdas, stress_unit_vector(n, rng)
+
+def stress_lemma_inputs(n, rng):
+    """Lemma 3.1 地狱模式 (复刻 test lemma 3.1 new.py): 整数谱制造重根 + 零/微小权重"""
+    lambdas = np.sort(rng.integers(-10, 10, n).astype(float))[::-1]
+    return lambdas, stress_unit_vector(n, rng)
 
 # ==========================================
 # Theorem 2.2: Weighted Projection (Main Result)
 # ==========================================
-def check_weighted_theorem(n, l, r, stress_mode=False):
+def weighted_spectra(n, stress_mode=False, method="auto", rng=None, inputs=None, field="complex"):
+    """Theorem 2.2 一个样本的 (lambdas 降序, weights, mus 降序), 参数同 check_weighted_theorem"""
+    rng = as_rng(rng)
     if stress_mode:
-        # 地狱模式：完全复刻脚本逻辑
-        # 1. 强制重根
-        raw_vals = np.random.uniform(-10, 10, n)
-        if np.random.rand() < 0.5:
-            dup_idx = np.random.randint(0, n-2)
-            raw_vals[dup_idx+1] = raw_vals[dup_idx]
-            if n > 3: raw_vals[dup_idx+2] = raw_vals[dup_idx]
-        lambdas = np.sort(raw_vals)[::-1]
-
-        # 2. 强制零权重/微小权重 (复刻 logic)
-        u = np.random.randn(n)
-        rand_val = np.random.rand()
-        if rand_val < 0.3:
-            # 30% 概率：绝对零
-            u[np.random.randint(0, n)] = 0.0
-        elif rand_val < 0.6:
-            # 30% 概率：微小值 (1e-8)
-            u[np.random.randint(0, n)] = 1e-8
-            
-        u /= np.linalg.norm(u)
+        if inputs is None:
+            with stage("generate"): inputs = stress_weighted_inputs(n, rng)
+        lambdas, u = inputs
         weights = u**2
         
-        try:
-            V = null_space(u.reshape(1, -1))
-            mus = np.sort(eigvalsh(V.T @ np.diag(lambdas) @ V))[::-1]
-        except:
-            Q, _ = qr(u.reshape(-1, 1), mode='full')
-            V = Q[:, 1:]
-            mus = np.sort(eigvalsh(V.T @ np.diag(lambdas) @ V))[::-1]
+        # method="dense" 保留原来的 null_space/QR 路径作为交叉验证; "auto" 按 n 选择
+        if method == "auto":
+            method = "secular" if n >= PROJECTION_SECULAR_MIN_N else "dense"
+        if method == "dense":
+            mus = projection_spectrum_dense(lambdas, u)
+        else:
+            mus = projection_spectrum(lambdas, weights)
     else:
         # 普通模式
-        A = generate_hermitian(n)
-        lambdas, V_eigen = np.linalg.eigh(A)
+        with stage("generate"): A = generate_hermitian(n, rng, field)
+        with stage("eigh"): lambdas, V_eigen = np.linalg.eigh(A)
         idx = np.argsort(lambdas)[::-1]
         lambdas = lambdas[idx]
         V_eigen = V_eigen[:, idx]
         
-        u = np.random.randn(n) + 1j * np.random.randn(n)
-        u /= np.linalg.norm(u)
+        u = random_unit_vector(n, rng, field)
         u_rotated = V_eigen.conj().T @ u
         weights = np.abs(u_rotated)**2 
         
-        Q, _ = qr(u.reshape(-1, 1), mode='full')
-        V_perp = Q[:, 1:] 
-        sub_mat = V_perp.conj().T @ A @ V_perp
-        mus = np.linalg.eigvalsh(sub_mat)[::-1]
+        # A 在 u⊥ 上的压缩: 小 n 用 QR 基, 大 n 用一次 Householder 秩 2 更新 (不构造完整的 Q)
+        with stage("compress"): sub_mat = compress_to_complement(A, u)
+        with stage("eigvalsh"): mus = np.linalg.eigvalsh(sub_mat)[::-1]
+    return lambdas, weights, mus
 
+def check_weighted_theorem(n, l, r, stress_mode=False, method="auto", rng=None, inputs=None, field="complex"):
+    """inputs: 地狱模式下可直接给定 (lambdas, u), 用于重新检验存档的样本
+    field 只作用于普通模式的 A 和 u; 地狱模式的输入本来就是实数"""
+    lambdas, weights, mus = weighted_spectra(n, stress_mode, method, rng, inputs, field)
+    return weighted_single_window(n, l, r, lambdas, weights, mus)
+
+@staged("bounds")
+def weighted_single_window(n, l, r, lambdas, weights, mus):
+    """由一个样本的谱检验窗口 [l, r], 返回值同 check_weighted_theorem"""
     if r >= n-1: r = n-2
     
     sum_mu = np.sum(mus[l : r + 1])
@@ -144,75 +730,173 @@ def check_weighted_theorem(n, l, r, stress_mode=False):
     passed = (violation == 0.0)
     return passed, sum_mu, lhs, rhs, violation
 
+@lru_cache(maxsize=None)
+def weighted_windows(n):
+    """Theorem 2.2 的全部合法窗口 0 <= l <= r <= n-2 (0 起始, 与 check_weighted_theorem 相同), 返回 (ls, rs)"""
+    ls, rs = np.triu_indices(n - 1)
+    ls.setflags(write=False)
+    rs.setflags(write=False)
+    return ls, rs
+
+def weighted_trace_windows(n, ls, rs):
+    """窗口 [0, n-2] 上 sum mu 与两个界都等于 tr(Lambda) - sum_i w_i lambda_i (迹恒等式), slack 恒为 0, 只剩舍入误差"""
+    return (np.asarray(ls) == 0) & (np.asarray(rs) == n - 2)
+
+def weighted_window_sweep(lambdas, weights, mus):
+    """由一个样本的 (lambdas, weights, mus) 一次性检验全部窗口 (可带前导批维度)
+    mus, lambdas, weights, weights*lambdas 各做一次前缀和, 每个窗口的 sum mu, U_l, L_{r+1}, LHS, RHS 都是 O(1) 查表
+    返回 sums, lhss, rhss, slacks, 形状 (..., n-1, n-1), 下标 [l, r]; 非法窗口 (r < l) 为 NaN,
+    退化窗口 (U_l 或 L_{r+1} < 1e-12, check_weighted_theorem 直接判通过) 的 lhs / rhs 为 NaN, slack 为 inf"""
+    n = lambdas.shape[-1]
+    zeros = np.zeros(lambdas.shape[:-1] + (1,))
+    cum = lambda x: np.concatenate([zeros, np.cumsum(x, axis=-1)], axis=-1)
+    c_mu, c_lam, c_w, c_wl = cum(mus), cum(lambdas), cum(weights), cum(weights * lambdas)
+
+    l = np.arange(n - 1)[:, None]
+    r = np.arange(n - 1)[None, :]
+    # 区间 [a, b] 的和 = c[b+1] - c[a]; 广播后形状 (..., n-1, n-1), 行对应 l, 列对应 r
+    span = lambda c, a, b: c[..., b + 1] - c[..., a]
+    sums = span(c_mu, l, r)
+    U_l = c_w[..., -1:, None] - c_w[..., l]
+    L_r_plus_1 = c_w[..., r + 2]
+    degenerate = (U_l < 1e-12) | (L_r_plus_1 < 1e-12)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # RHS = sum_{l..r} lambda - sum_{l..r} w_i (lambda_i - lambda_{r+1}) / U_l
+        rhss = span(c_lam, l, r) - (span(c_wl, l, r) - lambdas[..., r + 1] * span(c_w, l, r)) / U_l
+        # LHS = sum_{l+1..r+1} lambda + sum_{l+1..r+1} w_i (lambda_l - lambda_i) / L_{r+1}
+        lhss = span(c_lam, l + 1, r + 1) + (lambdas[..., l] * span(c_w, l + 1, r + 1) - span(c_wl, l + 1, r + 1)) / L_r_plus_1
+    slacks = np.minimum(sums - lhss, rhss - sums)
+    lhss[degenerate] = np.nan
+    rhss[degenerate] = np.nan
+    slacks[degenerate] = np.inf
+    invalid = np.broadcast_to(r < l, sums.shape)
+    for arr in (sums, lhss, rhss, slacks):
+        arr[invalid] = np.nan
+    return sums, lhss, rhss, slacks
+
+def check_weighted_windows(n, stress_mode=False, method="auto", rng=None, inputs=None, field="complex"):
+    """同一个样本检验全部窗口: 谱只生成一次, 再由 weighted_window_sweep 扫完约 n^2/2 个不等式
+    返回 passed, sums, lhss, rhss, slacks (长度 W 的数组), 顺序与 weighted_windows(n) 一致; 判定与 check_weighted_theorem 相同 (容差 1e-9)"""
+    lambdas, weights, mus = weighted_spectra(n, stress_mode, method, rng, inputs, field)
+    with stage("window_sweep"):
+        tables = weighted_window_sweep(lambdas, weights, mus)
+        ls, rs = weighted_windows(n)
+        sums, lhss, rhss, slacks = (table[ls, rs] for table in tables)
+    return slacks >= -1e-9, sums, lhss, rhss, slacks
+
 # ==========================================
 # Lemma 3.1: Polynomial Roots
 # ==========================================
-def check_lemma_polynomial(n, stress_mode=False):
+def _leave_one_out(log_abs, sign):
+    """逐行求 prod_{j != i} 的对数幅值与符号, 用前缀/后缀累积 (不做除法, 零因子也安全)"""
+    K = log_abs.shape[0]
+    zeros, ones = np.zeros((K, 1)), np.ones((K, 1))
+    log_pre = np.concatenate([zeros, np.cumsum(log_abs[:, :-1], axis=1)], axis=1)
+    log_suf = np.concatenate([np.cumsum(log_abs[:, :0:-1], axis=1)[:, ::-1], zeros], axis=1)
+    sign_pre = np.concatenate([ones, np.cumprod(sign[:, :-1], axis=1)], axis=1)
+    sign_suf = np.concatenate([np.cumprod(sign[:, :0:-1], axis=1)[:, ::-1], ones], axis=1)
+    return log_pre + log_suf, sign_pre * sign_suf
+
+def poly_values(lambdas, weights, x_vec, log_scale=0.0):
+    """向量化求 P(x) / exp(log_scale), P(x) = sum_i w_i * prod_{j != i} (lambda_j - x)
+    log_scale 可为标量或与 x_vec 同形; 各项在对数域里累积并做 log-sum-exp, 大 n 时缩放后的值不会溢出"""
+    x_vec = np.asarray(x_vec, dtype=float)
+    diff = lambdas[None, :] - x_vec.reshape(-1, 1)
+    with np.errstate(divide='ignore'):
+        loo_log, loo_sign = _leave_one_out(np.log(np.abs(diff)), np.where(diff < 0, -1.0, 1.0))
+        log_terms = np.log(weights) + loo_log - np.reshape(log_scale, (-1, 1))
+    top = np.max(log_terms, axis=1, keepdims=True)
+    top[~np.isfinite(top)] = 0.0
+    vals = np.sum(loo_sign * np.exp(log_terms - top), axis=1)
+    with np.errstate(over='ignore'):
+        vals = vals * np.exp(top[:, 0])
+    return vals.reshape(x_vec.shape)
+
+def poly_log_magnitude(lambdas, weights, x_vec):
+    """log sum_i w_i * prod_{j != i} max(|lambda_j - x|, tau): P(x) 各项的量级, 用作残差的尺度
+    tau = sqrt(eps) * max(|lambda|, 1) 防止落在重根/零权重极点上的根让尺度也一起趋于 0"""
+    x_vec = np.asarray(x_vec, dtype=float)
+    tau = np.sqrt(np.finfo(float).eps) * max(np.max(np.abs(lambdas)), 1.0)
+    mag = np.maximum(np.abs(lambdas[None, :] - x_vec.reshape(-1, 1)), tau)
+    with np.errstate(divide='ignore'):
+        loo_log, _ = _leave_one_out(np.log(mag), np.ones_like(mag))
+        log_terms = np.log(weights) + loo_log
+        top = np.max(log_terms, axis=1, keepdims=True)
+        top[~np.isfinite(top)] = 0.0
+        log_mag = top[:, 0] + np.log(np.sum(np.exp(log_terms - top), axis=1))
+    return log_mag.reshape(x_vec.shape)
+
+# 残差在 n 达到该值才走对数域 (poly_log_magnitude + poly_values); 更小的 n 直接连乘,
+# 各因子 |lambda_j - x| 有界, 连乘不会溢出, 又省掉前缀/后缀累积的多次小数组调用 (GUI 默认 n = 4..5)
+POLY_LOG_MIN_N = 16
+
+def poly_residuals_direct(lambdas, weights, x_vec):
+    """小 n 的残差 P(x) / sum_i w_i * prod_{j != i} max(|lambda_j - x|, tau), 直接构造 (K, n, n) 连乘
+    与对数域路径同一个尺度 (含 tau 下限); 尺度为 0 时残差按 0 计"""
+    x_vec = np.asarray(x_vec, dtype=float)
+    n = len(lambdas)
+    tau = np.sqrt(np.finfo(float).eps) * max(np.max(np.abs(lambdas)), 1.0)
+    diff = lambdas[None, :] - x_vec.reshape(-1, 1)
+    idx = np.arange(n)
+    loo = np.repeat(diff[:, None, :], n, axis=1)
+    loo[:, idx, idx] = 1.0
+    vals = np.prod(loo, axis=2) @ weights
+    np.abs(loo, out=loo)
+    np.maximum(loo, tau, out=loo)
+    loo[:, idx, idx] = 1.0
+    scale = np.prod(loo, axis=2) @ weights
+    residuals = np.zeros_like(vals)
+    np.divide(vals, scale, out=residuals, where=scale > 0)
+    return residuals.reshape(x_vec.shape)
+
+def check_lemma_polynomial(n, stress_mode=False, method="auto", rng=None, inputs=None, field="complex"):
+    """field 只作用于普通模式的 A 和 u (同 check_weighted_theorem)"""
+    rng = as_rng(rng)
     if stress_mode:
-        # 地狱模式：复刻 test lemma 3.1 new.py 的核心逻辑
-        
-        # 1. 制造重根 (随机整数范围 -10 到 10)
-        lambdas = np.sort(np.random.randint(-10, 10, n).astype(float))[::-1]
-        
-        # 2. 制造零权重/微小权重 (恐怖谷)
-        u = np.random.randn(n)
-        rand_val = np.random.rand()
-        
-        if rand_val < 0.3:
-            # 30% 概率：绝对零
-            u[np.random.randint(0, n)] = 0.0
-        elif rand_val < 0.6:
-            # 30% 概率：微小值 (1e-8) - 专门测试数值稳定性
-            u[np.random.randint(0, n)] = 1e-8
-            
-        u /= np.linalg.norm(u)
+        # 地狱模式：重根 + 零权重/微小权重 (恐怖谷)
+        if inputs is None:
+            with stage("generate"): inputs = stress_lemma_inputs(n, rng)
+        lambdas, u = inputs
         weights = u**2
         
-        try:
-            Q = null_space(u.reshape(1, -1))
-            mus_geometric = eigvalsh(Q.T @ np.diag(lambdas) @ Q)
-        except:
-            Q, _ = qr(u.reshape(-1, 1), mode='full')
-            mus_geometric = eigvalsh(Q[:, 1:].T @ np.diag(lambdas) @ Q[:, 1:])
+        if method == "auto":
+            method = "secular" if n >= PROJECTION_SECULAR_MIN_N else "dense"
+        if method == "dense":
+            mus_geometric = projection_spectrum_dense(lambdas, u)
+        else:
+            mus_geometric = projection_spectrum(lambdas, weights)
     else:
         # 普通模式 (用于可视化)
-        A = generate_hermitian(n)
-        lambdas, V = np.linalg.eigh(A)
+        with stage("generate"): A = generate_hermitian(n, rng, field)
+        with stage("eigh"): lambdas, V = np.linalg.eigh(A)
         idx = np.argsort(lambdas)[::-1]
         lambdas = lambdas[idx]
         V = V[:, idx]
         
-        u = np.random.randn(n) + 1j * np.random.randn(n)
-        u /= np.linalg.norm(u)
+        u = random_unit_vector(n, rng, field)
         weights = np.abs(V.conj().T @ u)**2 
         
-        Q, _ = qr(u.reshape(-1, 1), mode='full')
-        V_perp = Q[:, 1:]
-        mus_geometric = eigvalsh(V_perp.conj().T @ A @ V_perp)
+        with stage("compress"): sub_mat = compress_to_complement(A, u)
+        with stage("eigvalsh"): mus_geometric = np.linalg.eigvalsh(sub_mat)
 
     mus_geometric = np.sort(mus_geometric)[::-1]
 
-    # 定义多项式函数 P(x)
+    # 定义多项式函数 P(x); 画图时在主调线程里求值, 计时记在调用时所在线程的 profile 上
     def poly_func(x_vec):
-        y_vec = np.zeros_like(x_vec, dtype=float)
-        for k, x in enumerate(x_vec):
-            val = 0.0
-            for i in range(n):
-                # prod(lambda_j - x) for j != i
-                term = weights[i]
-                for j in range(n):
-                    if i == j: continue
-                    term *= (lambdas[j] - x)
-                val += term
-            y_vec[k] = val
-        return y_vec
-
-    residuals = poly_func(mus_geometric)
-    
-    # 归一化处理
-    scale = np.mean(np.abs(lambdas))**(n-2) if n > 2 else 1.0
-    if scale < 1e-6: scale = 1.0
-    max_res = np.max(np.abs(residuals)) / scale
+        with stage("poly_func"): return poly_values(lambdas, weights, x_vec)
+
+    # 归一化处理: 每个根处除以各项量级之和 (对数域), 原来的 mean|lambda|^(n-2)
+    # 只在 n < 10 左右有意义, n 再大时残差会随 n 指数增长
+    # 量级为 0 时 |P| <= 0, 残差按 0 计
+    with stage("residuals"):
+        if n < POLY_LOG_MIN_N:
+            residuals = poly_residuals_direct(lambdas, weights, mus_geometric)
+        else:
+            log_scale = poly_log_magnitude(lambdas, weights, mus_geometric)
+            finite = np.isfinite(log_scale)
+            residuals = np.zeros_like(mus_geometric)
+            residuals[finite] = poly_values(lambdas, weights, mus_geometric[finite], log_scale[finite])
+        max_res = np.max(np.abs(residuals)) if n > 1 else 0.0
     
     # 稍微放宽一点阈值，因为微小权重可能导致高阶多项式数值抖动
     passed = (max_res < 1e-4)
@@ -221,4 +905,4 @@ def check_lemma_polynomial(n, stress_mode=False):
     if padding == 0: padding = 1.0
     x_range = (lambdas[-1] - padding, lambdas[0] + padding)
 
-    return passed, lambdas, mus_geometric, poly_func, x_range, max_res
\ No newline at end of file
+    return passed, lambdas, mus_geometric, poly_func, x_range, max_res
\ No newline at end of file
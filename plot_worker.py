@@ -0,0 +1,108 @@
+# 文件名: plot_worker.py
+# 单次检验 (Single Check) 的后台绘图: 计算和 Agg 离屏渲染都在工作线程里完成,
+# 主线程只把画好的 Figure 换到画布上; PNG 由单独的写盘线程写出, 写完后回调状态栏.
+# 渲染期间的重复点击不排队, 只保留最后一次请求
+import io
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from progress import FRAME_MS
+
+# 导出 PNG 的分辨率 (与原先 savefig(dpi=150) 相同)
+EXPORT_DPI = 150
+
+class PlotWorker:
+    """每个 Tab 一个, 包住该 Tab 的 FigureCanvasTkAgg
+    plot(fig, *args) 在工作线程里计算并画到一个新的 Figure 上 (不能碰 Tk 控件)"""
+    def __init__(self, canvas, status=None, on_error=print):
+        self.canvas = canvas
+        self.widget = canvas.get_tk_widget()
+        self.status = status
+        self.on_error = on_error
+        self.queue = queue.SimpleQueue()
+        self.lock = threading.Lock()
+        self.pending = None
+        self.busy = False
+        self.writes = 0 # 已交给写盘线程、还没回报的 PNG 个数
+        self.polling = False
+        self._writer = ThreadPoolExecutor(max_workers=1)
+
+    # ---------- 主线程 ----------
+    def request(self, plot, path, *args):
+        """提交一次绘图; 正在渲染时只替换待办的那一个请求"""
+        fig = self.canvas.figure
+        size = (tuple(fig.get_size_inches()), fig.dpi) # 按画布当前尺寸排版, 换上去时不用重新布局
+        with self.lock:
+            self.pending = (plot, path, args, size)
+            start = not self.busy
+            self.busy = True
+        if start: threading.Thread(target=self._loop, daemon=True).start()
+        if not self.polling:
+            self.polling = True
+            self.widget.after(FRAME_MS, self._poll)
+
+    def _poll(self):
+        while True:
+            try: fn, args = self.queue.get_nowait()
+            except queue.Empty: break
+            fn(*args)
+        with self.lock:
+            self.polling = self.busy or self.writes > 0 or not self.queue.empty()
+        if self.polling: self.widget.after(FRAME_MS, self._poll)
+
+    def _swap(self, fig, renderer):
+        """换上画好的 Figure; 尺寸没变时直接贴工作线程渲染好的像素"""
+        fig.set_canvas(self.canvas)
+        self.canvas.figure = fig
+        if (renderer.width, renderer.height) == self.canvas.get_width_height(physical=True):
+            self.canvas.renderer = renderer
+            self.canvas.blit()
+        else:
+            self.canvas.draw()
+
+    def _written(self, path, error):
+        with self.lock: self.writes -= 1
+        if error is not None:
+            msg = f"Export failed: {error}"
+        else:
+            msg = f"Plot saved to: {os.path.abspath(path)}"
+        print(f"[Output] {msg}")
+        if self.status is not None: self.status(msg)
+
+    # ---------- 工作线程 ----------
+    def _loop(self):
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        while True:
+            with self.lock:
+                req, self.pending = self.pending, None
+                if req is None:
+                    self.busy = False
+                    return
+            plot, path, args, (figsize, dpi) = req
+            try:
+                fig = Figure(figsize=figsize, dpi=dpi)
+                agg = FigureCanvasAgg(fig)
+                plot(fig, *args)
+                buf = io.BytesIO()
+                fig.savefig(buf, format="png", dpi=EXPORT_DPI)
+                agg.draw() # 最后按屏幕 DPI 渲染一遍, 主线程直接贴图
+            except Exception as e:
+                self.queue.put((self.on_error, (e,)))
+                continue
+            with self.lock: self.writes += 1
+            self._writer.submit(self._write, path, buf.getvalue())
+            self.queue.put((self._swap, (fig, agg.renderer)))
+
+    def _write(self, path, data):
+        """写盘线程: 先写临时文件再改名"""
+        error = None
+        try:
+            with open(path + ".tmp", "wb") as f:
+                f.write(data)
+            os.replace(path + ".tmp", path)
+        except OSError as e:
+            error = e
+        self.queue.put((self._written, (path, error)))
@@ -0,0 +1,96 @@
+# 文件名: progress.py
+# GUI 审计的后台任务与进度通道: Tk 不是线程安全的, 工作线程不直接碰控件.
+# 工作线程只做整数赋值 (done / total) 和往队列里放回调; 主线程用 after 以固定帧率
+# 取走队列并刷新进度条、吞吐量和 ETA
+import time
+import queue
+import threading
+
+# 主线程刷新间隔 (毫秒), 约 10 帧/秒
+FRAME_MS = 100
+
+def format_eta(seconds):
+    seconds = int(seconds)
+    return f"{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+class TabJob:
+    """每个 Tab 一个: 同一时间只允许一个后台任务 (重复点击直接忽略)
+    工作线程接口: set_total / done (计数) / stage (状态文字) / cancelled / post
+    主线程接口: start / cancel"""
+    def __init__(self, widget, progressbar, label, run_buttons=(), cancel_button=None):
+        self.widget = widget
+        self.progressbar = progressbar
+        self.label = label
+        self.run_buttons = list(run_buttons)
+        self.cancel_button = cancel_button
+        self.queue = queue.SimpleQueue()
+        self.running = False
+        self.finished = False
+        self.cancelled = False
+        self.done = 0
+        self.total = 0
+        self.stage = ""
+        if cancel_button is not None: cancel_button.config(state="disabled", command=self.cancel)
+
+    # ---------- 主线程 ----------
+    def start(self, target, *args):
+        """启动后台任务; 已有任务在跑时返回 False"""
+        if self.running: return False
+        self.running, self.finished, self.cancelled = True, False, False
+        self.done, self.total, self.stage = 0, 0, "Running"
+        self.base, self.t0 = 0, time.perf_counter()
+        for btn in self.run_buttons: btn.config(state="disabled")
+        if self.cancel_button is not None: self.cancel_button.config(state="normal")
+        self.progressbar['maximum'] = 100
+        self.progressbar['value'] = 0
+        self.label.config(text="Running...", bootstyle="warning")
+        threading.Thread(target=self._run, args=(target, args), daemon=True).start()
+        self.widget.after(FRAME_MS, self._poll)
+        return True
+
+    def cancel(self):
+        """请求停止; 工作线程在下一次检查 cancelled 时自行收尾"""
+        if self.running:
+            self.cancelled = True
+            self.stage = "Cancelling"
+
+    def _run(self, target, args):
+        try:
+            target(*args)
+        finally:
+            self.finished = True
+
+    def _drain(self):
+        while True:
+            try: fn, args, kwargs = self.queue.get_nowait()
+            except queue.Empty: return
+            fn(*args, **kwargs)
+
+    def _render(self):
+        if self.total <= 0: return
+        elapsed = time.perf_counter() - self.t0
+        rate = (self.done - self.base) / elapsed if elapsed > 0 else 0.0
+        eta = format_eta((self.total - self.done) / rate) if rate > 0 else "--:--:--"
+        self.progressbar['value'] = 100.0 * self.done / self.total
+        self.label.config(text=f"{self.stage}: {self.done}/{self.total}\n{rate:,.0f} samples/s  ETA {eta}")
+
+    def _poll(self):
+        finished = self.finished
+        self._render()
+        self._drain()
+        if not finished:
+            self.widget.after(FRAME_MS, self._poll)
+            return
+        self.running = False
+        for btn in self.run_buttons: btn.config(state="normal")
+        if self.cancel_button is not None: self.cancel_button.config(state="disabled")
+
+    # ---------- 工作线程 ----------
+    def set_total(self, total, done=0):
+        """done: 从断点继续时已完成的数目 (不计入吞吐量)"""
+        self.total, self.done, self.base = total, done, done
+        self.t0 = time.perf_counter()
+
+    def post(self, fn, *args, **kwargs):
+        """让 fn(*args, **kwargs) 在主线程执行 (更新结果标签、弹出报告等)"""
+        self.queue.put((fn, args, kwargs))
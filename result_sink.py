@@ -0,0 +1,120 @@
+# 文件名: result_sink.py
+# 逐样本结果的列式存储: 每列一个预分配的 .npy 文件 (内存映射), 记录先写进内存块,
+# 满 chunk_rows 行后整块拷进 memmap; 分析时 load_results 直接映射各列, 不用解析 CSV
+import os
+import json
+import numpy as np
+
+MANIFEST = "manifest.json"
+
+# 每次整块写入的行数
+CHUNK_ROWS = 65536
+
+# (列名, dtype); l, r 为窗口 (hierarchy 存 m, k, lemma 无参数时为 -1)
+# sum / lhs / rhs: 被检验的量与下界 / 上界, 没有对应量的列为 NaN; slack 越小越接近违背
+COLUMNS = [
+    ("n", "<i4"),
+    ("l", "<i4"),
+    ("r", "<i4"),
+    ("index", "<i8"),
+    ("sum", "<f8"),
+    ("lhs", "<f8"),
+    ("rhs", "<f8"),
+    ("slack", "<f8"),
+    ("violation", "<f8"),
+    ("passed", "|b1"),
+]
+
+PARAM_NAMES = {"bounds": ("l", "r"), "weighted": ("l", "r"), "hierarchy": ("m", "k"), "lemma": ()}
+
+def column_path(directory, name):
+    return os.path.join(directory, f"{name}.npy")
+
+def write_manifest(directory, manifest):
+    tmp = os.path.join(directory, MANIFEST + ".tmp")
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp, os.path.join(directory, MANIFEST))
+
+def create_columns(directory, theorem, seed, capacity, field="complex"):
+    """预分配 capacity 行的各列文件并写 manifest (rows=0)
+    run seed 是 128 位熵值, 放不进整数列, 所以只记在 manifest 里;
+    第 i 行样本的随机数由 (seed, theorem, n, index) 唯一确定, 可用 audit_cli replay 重放 (需同一 field)"""
+    os.makedirs(directory, exist_ok=True)
+    for name, dtype in COLUMNS:
+        mm = np.lib.format.open_memmap(column_path(directory, name), mode="w+", dtype=dtype, shape=(capacity,))
+        del mm
+    write_manifest(directory, {
+        "theorem": theorem,
+        "seed": seed,
+        "field": field,
+        "capacity": capacity,
+        "rows": 0,
+        "columns": [name for name, _ in COLUMNS],
+        "window": list(PARAM_NAMES[theorem]),
+    })
+    return directory
+
+def finish(directory, rows):
+    """写完后在 manifest 里记下有效行数"""
+    with open(os.path.join(directory, MANIFEST)) as f:
+        manifest = json.load(f)
+    manifest["rows"] = int(rows)
+    write_manifest(directory, manifest)
+
+class ResultSink:
+    """向已预分配的列从第 offset 行开始顺序写入
+    多个进程可各自打开同一组列, 只要写入的行段互不重叠"""
+    def __init__(self, directory, offset=0, chunk_rows=CHUNK_ROWS):
+        with open(os.path.join(directory, MANIFEST)) as f:
+            self.param_names = PARAM_NAMES[json.load(f)["theorem"]]
+        self.columns = {name: np.load(column_path(directory, name), mmap_mode="r+") for name, _ in COLUMNS}
+        self.buffers = {name: np.empty(chunk_rows, dtype=dtype) for name, dtype in COLUMNS}
+        self.chunk_rows = chunk_rows
+        self.pos = offset
+        self.fill = 0
+
+    def append(self, n, params, index, passed, violation, slack, values):
+        """写入一条记录 (只写内存块); values = (sum, lhs, rhs)"""
+        b, j = self.buffers, self.fill
+        p = [params[k] for k in self.param_names] + [-1, -1]
+        b["n"][j], b["l"][j], b["r"][j], b["index"][j] = n, p[0], p[1], index
+        b["sum"][j], b["lhs"][j], b["rhs"][j] = values
+        b["slack"][j], b["violation"][j], b["passed"][j] = slack, violation, passed
+        self.fill += 1
+        if self.fill == self.chunk_rows: self.flush()
+
+    def append_batch(self, **cols):
+        """批量写入: 每列一个等长数组 (或标量), 直接整块拷进 memmap"""
+        self.flush()
+        rows = max(np.size(v) for v in cols.values())
+        for name, value in cols.items():
+            self.columns[name][self.pos:self.pos + rows] = value
+        self.pos += rows
+
+    def flush(self):
+        if self.fill == 0: return
+        for name, col in self.columns.items():
+            col[self.pos:self.pos + self.fill] = self.buffers[name][:self.fill]
+        self.pos += self.fill
+        self.fill = 0
+
+    def sync(self):
+        """写出当前块并刷盘 (写断点之前调用, 保证断点之前的行都已落盘)"""
+        self.flush()
+        for col in self.columns.values(): col.flush()
+
+    def close(self):
+        """写出剩余的块并刷盘, 返回写到的行号"""
+        self.flush()
+        for col in self.columns.values(): col.flush()
+        self.columns = {}
+        return self.pos
+
+def load_results(directory):
+    """返回 (manifest, {列名: 只读 memmap}), 各列已截到有效行数"""
+    with open(os.path.join(directory, MANIFEST)) as f:
+        manifest = json.load(f)
+    rows = manifest["rows"]
+    cols = {name: np.load(column_path(directory, name), mmap_mode="r")[:rows] for name in manifest["columns"]}
+    return manifest, cols
@@ -0,0 +1,51 @@
+# 文件名: stage_report.py
+# 审计报告里的阶段耗时表: 数据来自 matrix_utils.StageProfile (勾选 "Record stage timings" 时才记录),
+# 在报告窗口里显示每个阶段的次数、总耗时、占比和直方图分位数, 并随结果一起导出为 JSON
+import json
+
+try:
+    import ttkbootstrap as ttk
+    from ttkbootstrap.constants import *
+except ImportError:
+    import tkinter as ttk
+    from tkinter.constants import *
+
+STAGES_FILE = "stages.json"
+
+def format_seconds(sec):
+    if sec >= 1: return f"{sec:.2f} s"
+    if sec >= 1e-3: return f"{sec * 1e3:.2f} ms"
+    return f"{sec * 1e6:.1f} us"
+
+def save_stages(path, profile, **meta):
+    """阶段计时的完整数据 (汇总 + 直方图桶) 写成 JSON; meta 为附加字段 (定理, 种子等)"""
+    data = dict(meta)
+    data.update(profile.to_dict())
+    with open(path, "w") as f:
+        json.dump(data, f, indent=1)
+    print(f"[Output] Stage timings saved to: {path}")
+
+def add_stage_table(parent, profile):
+    """在 parent 里加一个阶段耗时表 (按总耗时降序)"""
+    frame = ttk.Labelframe(parent, text="Stage Timings (checker hot path)", padding=5)
+    frame.pack(fill=BOTH, expand=True, padx=10, pady=5)
+    cols = ("Stage", "Calls", "Total", "Share", "Mean", "p50", "p90", "p99", "Max")
+    rows = profile.summary()
+    tree = ttk.Treeview(frame, columns=cols, show="headings", height=min(max(len(rows), 1), 10))
+    for col in cols:
+        tree.heading(col, text=col)
+        tree.column(col, anchor=CENTER, width=80)
+    for row in rows:
+        tree.insert("", "end", values=(row["stage"], row["count"], format_seconds(row["total"]), f"{100 * row['share']:.1f}%",
+                                       format_seconds(row["mean"]), format_seconds(row["p50"]), format_seconds(row["p90"]),
+                                       format_seconds(row["p99"]), format_seconds(row["max"])))
+    tree.pack(fill=BOTH, expand=True)
+    return frame
+
+def show_stage_report(title, profile):
+    """没有报告窗口的审计 (Bounds 逐样本、Lemma) 单独弹出阶段耗时表"""
+    top = ttk.Toplevel()
+    top.title(title)
+    top.geometry("760x360")
+    add_stage_table(top, profile)
+    ttk.Button(top, text="Close", command=top.destroy, bootstyle="secondary").pack(pady=10)
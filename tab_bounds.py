@@ -1,11 +1,7 @@
 # 文件名: tab_bounds.py
 import os
-import threading
 import datetime # <--- 新增
 import numpy as np
-import matplotlib.pyplot as plt
-from matplotlib.figure import Figure
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 
 try:
     import ttkbootstrap as ttk
@@ -17,15 +13,34 @@ except ImportError:
 
 import matrix_utils as utils
 import theorem_texts as txt
+import banner_cache
+import audits
+import result_sink
+import stage_report
+from progress import TabJob
+from plot_worker import PlotWorker
 
 class BoundsTab:
-    def __init__(self, notebook, output_dir):
+    BATCH_SIZE = 500 # 每批矩阵数, 兼顾内存与进度刷新
+
+    def __init__(self, notebook, output_dir, status=None):
         self.output_dir = output_dir
+        self.status = status # 主窗口状态栏回调 (PNG 写完后报告路径)
         self.frame = ttk.Frame(notebook, padding=10)
         notebook.add(self.frame, text="Theorem 1.4: Bounds")
+        # 界面 (含 matplotlib 图和 LaTeX 横幅) 在第一次切到该 Tab 时才构建, 见 main.py
+        self.built = False
+
+    def build(self):
+        if self.built: return
+        self.built = True
         self.init_ui()
 
     def init_ui(self):
+        # matplotlib 延迟到构建界面时才导入
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+
         paned = ttk.Panedwindow(self.frame, orient=HORIZONTAL)
         paned.pack(fill=BOTH, expand=True)
         
@@ -42,23 +57,27 @@ class BoundsTab:
 
         latex_frame = ttk.Frame(right_panel)
         latex_frame.pack(fill=X, padx=5, pady=2)
-        self.fig_latex = Figure(figsize=(8, 1), dpi=100)
-        try: self.fig_latex.patch.set_facecolor('#f8f9fa') 
-        except: pass
-        ax_lat = self.fig_latex.add_subplot(111)
-        ax_lat.axis('off')
-        ax_lat.text(0.5, 0.5, txt.THM1_4_LATEX, fontsize=13, ha='center', va='center')
-        self.canvas_latex = FigureCanvasTkAgg(self.fig_latex, master=latex_frame)
-        self.canvas_latex.draw()
-        self.canvas_latex.get_tk_widget().pack(fill=BOTH, expand=True)
+        # 静态横幅: 渲染结果按内容哈希缓存成 PNG, 之后直接用 PhotoImage 显示
+        self.img_latex = banner_cache.banner_photo(latex_frame, os.path.join(self.output_dir, ".banner_cache"), "thm1_4",
+                                                   txt.THM1_4_LATEX, figsize=(8, 1), fontsize=13)
+        ttk.Label(latex_frame, image=self.img_latex, anchor=CENTER).pack(fill=BOTH, expand=True)
 
         plot_frame = ttk.Labelframe(right_panel, text="Visualization Result", padding=5)
         plot_frame.pack(fill=BOTH, expand=True, padx=5, pady=5)
         self.fig_plot = Figure(figsize=(5, 4), dpi=100)
         self.canvas_plot = FigureCanvasTkAgg(self.fig_plot, master=plot_frame)
         self.canvas_plot.get_tk_widget().pack(fill=BOTH, expand=True)
+        # 单次检验的计算、渲染和导出都在后台线程, 连点只保留最后一次
+        self.plotter = PlotWorker(self.canvas_plot, self.status)
 
         # Left
+        # 随机矩阵的数域, 单次检验和批量检验共用; 实对称矩阵走实数 LAPACK 例程
+        field_frame = ttk.Labelframe(left_panel, text="Matrix Field", padding=10)
+        field_frame.pack(fill=X, padx=5, pady=5)
+        self.var_field = ttk.StringVar(value="complex")
+        ttk.Radiobutton(field_frame, text="Complex Hermitian", value="complex", variable=self.var_field).pack(anchor=W)
+        ttk.Radiobutton(field_frame, text="Real symmetric", value="real", variable=self.var_field).pack(anchor=W)
+
         ctrl_frame = ttk.Labelframe(left_panel, text="Single Check", padding=10)
         ctrl_frame.pack(fill=X, padx=5, pady=5)
         ttk.Label(ctrl_frame, text="Matrix Dimension (n):").pack(anchor=W)
@@ -76,13 +95,23 @@ class BoundsTab:
         self.spin_iter = ttk.Spinbox(mass_frame, from_=100, to=100000, increment=100)
         self.spin_iter.set(1000)
         self.spin_iter.pack(fill=X, pady=5)
+        self.var_all_windows = ttk.BooleanVar(value=False)
+        ttk.Checkbutton(mass_frame, text="Check all (l, r) windows per matrix", 
+                        variable=self.var_all_windows).pack(anchor=W, pady=5)
+        # 各阶段 (生成 / eigvalsh / 取子矩阵 ...) 的耗时直方图, 不勾选时没有任何开销
+        self.var_stages = ttk.BooleanVar(value=False)
+        ttk.Checkbutton(mass_frame, text="Record stage timings", variable=self.var_stages).pack(anchor=W)
         self.btn_mass = ttk.Button(mass_frame, text="Run Massive Test", bootstyle="danger-outline", 
                                    command=self.run_massive_thread)
         self.btn_mass.pack(fill=X, pady=10)
+        self.btn_cancel = ttk.Button(mass_frame, text="Cancel", bootstyle="secondary-outline")
+        self.btn_cancel.pack(fill=X, pady=(0, 10))
         self.progress = ttk.Progressbar(mass_frame, bootstyle="success-striped")
         self.progress.pack(fill=X, pady=5)
         self.lbl_result = ttk.Label(mass_frame, text="Status: Idle", font=("Consolas", 10))
         self.lbl_result.pack(fill=X)
+        # 后台任务: 进度经队列回到主线程刷新, 同时只允许一个任务
+        self.job = TabJob(self.frame, self.progress, self.lbl_result, [self.btn_mass], self.btn_cancel)
 
     def get_timestamp(self):
         return datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -90,78 +119,141 @@ class BoundsTab:
     def run_single(self):
         try:
             n = int(self.spin_n.get())
-            passed, sub_sum, lb, ub = utils.check_bounds_theorem(n, 1, n-2) 
-            # 注意：上面的 utils.check_bounds_theorem 返回值比较简单
-            # 为了画出你之前那个漂亮的“所有窗口”图，我们需要在本地重写一下逻辑，或者只画一个窗口
-            # 鉴于 Tab 1 之前的逻辑是画所有窗口，我们保持原样：
-
-            A = utils.generate_hermitian(n)
-            lambdas = np.linalg.eigvalsh(A)[::-1]
-            sub_eigs = []
-            idx_list = list(range(n))
-            for k in range(n):
-                keep = [i for i in idx_list if i != k]
-                sub_eigs.append(np.linalg.eigvalsh(A[np.ix_(keep, keep)])[::-1])
-            sub_eigs = np.array(sub_eigs)
-
-            windows = [(l, r) for l in range(n-1) for r in range(l, n-1)][::max(1, (n*n)//12)]
-            
-            self.fig_plot.clear()
-            ax = self.fig_plot.add_subplot(111)
-            
-            for i, (l_idx, r_idx) in enumerate(windows):
-                l, r = l_idx + 1, r_idx + 1
-                actual = np.sum(sub_eigs[:, l_idx:r_idx+1])
-                term_lam = np.sum(lambdas[l_idx : r_idx+1])
-                term_lam_next = np.sum(lambdas[l_idx+1 : r_idx+2])
-                
-                lb = (r - l + 1) * lambdas[l_idx] + (n - 1) * term_lam_next
-                ub = (n - 1) * term_lam + (r - l + 1) * lambdas[r_idx+1]
-                
-                ax.vlines(i, lb, ub, colors='gray', alpha=0.5, linewidth=2)
-                ax.plot(i, ub, '_', color='blue', markeredgewidth=2, markersize=10)
-                ax.plot(i, lb, '_', color='blue', markeredgewidth=2, markersize=10)
-                ax.plot(i, actual, 'o', color='#d62728', markersize=6, zorder=3)
-
-            ax.set_xticks(range(len(windows)))
-            ax.set_xticklabels([f"[{l+1},{r+1}]" for l,r in windows], rotation=45, fontsize=8)
-            ax.set_title(f"Bounds Verification (n={n})")
-            ax.set_ylabel("Sum")
-            self.fig_plot.tight_layout()
-            self.canvas_plot.draw()
-            
-            # --- 保存逻辑 ---
-            filename = f"Bounds_Check_n{n}_{self.get_timestamp()}.png"
-            path = os.path.join(self.output_dir, filename)
-            self.fig_plot.savefig(path, dpi=150)
-            print(f"[Output] Plot saved to: {os.path.abspath(path)}")
-            
-        except Exception as e:
+        except ValueError as e:
             print(e)
+            return
+        path = os.path.join(self.output_dir, f"Bounds_Check_n{n}_{self.get_timestamp()}.png")
+        self.plotter.request(self.plot_single, path, n, self.var_field.get())
 
-    def run_massive_thread(self):
-        threading.Thread(target=self.run_massive, daemon=True).start()
+    def plot_single(self, fig, n, field="complex"):
+        # 在 PlotWorker 的工作线程里执行: 只画到传入的 fig 上, 不碰 Tk 控件
+        A = utils.generate_hermitian(n, field=field)
+        lambdas = np.linalg.eigvalsh(A)[::-1]
+        sub_eigs = utils.get_deleted_sub_eigs(A)
+        # 同一个矩阵一次性检验全部窗口, 画图只挑其中一部分
+        sums, lbs, ubs, slacks = utils.bounds_window_sweep(lambdas, sub_eigs)
+        ls, rs = utils.bounds_windows(n)
+        n_passed = int(np.count_nonzero(slacks[ls - 1, rs - 1] >= -1e-7))
+
+        windows = [(l, r) for l in range(n-1) for r in range(l, n-1)][::max(1, (n*n)//12)]
+        
+        ax = fig.add_subplot(111)
+        
+        for i, (l_idx, r_idx) in enumerate(windows):
+            actual = sums[l_idx, r_idx]
+            lb = lbs[l_idx, r_idx]
+            ub = ubs[l_idx, r_idx]
+            
+            ax.vlines(i, lb, ub, colors='gray', alpha=0.5, linewidth=2)
+            ax.plot(i, ub, '_', color='blue', markeredgewidth=2, markersize=10)
+            ax.plot(i, lb, '_', color='blue', markeredgewidth=2, markersize=10)
+            ax.plot(i, actual, 'o', color='#d62728', markersize=6, zorder=3)
 
-    def run_massive(self):
+        ax.set_xticks(range(len(windows)))
+        ax.set_xticklabels([f"[{l+1},{r+1}]" for l,r in windows], rotation=45, fontsize=8)
+        ax.set_title(f"Bounds Verification (n={n}, {field}, {n_passed}/{len(ls)} windows passed)")
+        ax.set_ylabel("Sum")
+        fig.tight_layout()
+
+    def run_massive_thread(self):
+        # 控件只在主线程读取; 已有任务在跑时 start 直接忽略
         try:
             N = int(self.spin_iter.get())
             n = int(self.spin_n.get())
-            self.btn_mass.config(state="disabled")
-            self.lbl_result.config(text="Running...", bootstyle="warning")
-            self.progress['value'] = 0
+        except ValueError as e:
+            self.lbl_result.config(text=str(e))
+            return
+        self.job.start(self.run_massive, N, n, self.var_all_windows.get(), self.var_stages.get(),
+                       self.var_field.get())
+
+    def run_massive(self, N, n, all_windows, stages, field="complex"):
+        job = self.job
+        try:
+            job.set_total(N)
+            # 每块样本的 Generator 由 (seed, 块号) 派生 (audits.bounds_block), 单个样本仍可按序号用 audit_cli replay (同一 --field) 重放
+            seed = audits.new_run_seed()
+            print(f"[Run] Bounds massive test, n={n}, field={field}, seed={seed}")
+            profile = utils.StageProfile() if stages else None
             
+            if all_windows:
+                with utils.collect_stages(profile):
+                    self.run_massive_all_windows(N, n, seed, profile, field)
+                return
+
+            # 按块批量计算, 每块一次性生成 (T, n, n) 矩阵堆栈, 逐样本结果整块写进 .npy 列
+            samples_dir = result_sink.create_columns(
+                os.path.join(self.output_dir, f"Bounds_Samples_n{n}_{self.get_timestamp()}_seed{seed}"), "bounds", seed, N, field)
+            sink = result_sink.ResultSink(samples_dir)
             passed_count = 0
-            for i in range(N):
-                l = np.random.randint(1, n)
-                r = np.random.randint(l, n)
-                is_pass, _, _, _ = utils.check_bounds_theorem(n, l, r)
-                if is_pass: passed_count += 1
-                if i % 10 == 0: self.progress['value'] = i
+            with utils.collect_stages(profile):
+                for start in range(0, N, self.BATCH_SIZE):
+                    if job.cancelled: break
+                    T = min(self.BATCH_SIZE, N - start)
+                    batch = audits.bounds_batch(n, seed, start, start + T, field)
+                    audits.write_bounds_batch(sink, n, start, batch)
+                    passed_count += int(np.count_nonzero(batch[2]))
+                    job.done = start + T
             
-            self.progress['value'] = N
-            res = f"Passed: {passed_count}/{N}"
-            self.lbl_result.config(text=res, bootstyle="success" if passed_count==N else "danger")
+            done = sink.close()
+            result_sink.finish(samples_dir, done)
+            print(f"[Output] Per-sample columns saved to: {os.path.abspath(samples_dir)}")
+            if profile is not None:
+                stage_report.save_stages(os.path.join(samples_dir, stage_report.STAGES_FILE), profile,
+                                         theorem="bounds", n=n, samples=done, seed=seed, field=field)
+                job.post(stage_report.show_stage_report, f"Stage Timings (Bounds, n={n})", profile)
+            res = f"Passed: {passed_count}/{done}\nSeed: {seed}"
+            if job.cancelled: res = "Cancelled. " + res
+            job.post(self.lbl_result.config, text=res, bootstyle="success" if passed_count==done==N else "danger")
         except Exception as e:
-            self.lbl_result.config(text=str(e))
-        finally:
-            self.btn_mass.config(state="normal")
\ No newline at end of file
+            job.post(self.lbl_result.config, text=str(e), bootstyle="danger")
+
+    def run_massive_all_windows(self, N, n, seed, profile=None, field="complex"):
+        # 每个矩阵检验全部窗口, 按窗口累计失败数与最小 slack
+        job = self.job
+        ls, rs = utils.bounds_windows(n)
+        failures = np.zeros(len(ls), dtype=int)
+        min_slack = np.full(len(ls), np.inf)
+        for start in range(0, N, self.BATCH_SIZE):
+            if job.cancelled: break
+            T = min(self.BATCH_SIZE, N - start)
+            A = np.concatenate([blk[3] for blk in audits.bounds_blocks(n, seed, start, start + T, field)])
+            is_pass, slacks = utils.check_bounds_windows_batch(n, T, A=A)
+            failures += np.count_nonzero(~is_pass, axis=0)
+            min_slack = np.minimum(min_slack, slacks.min(axis=0))
+            job.done = start + T
+
+        N = job.done
+        total = N * len(ls)
+        passed_count = total - int(failures.sum())
+        res = f"Passed: {passed_count}/{total} windows\nSeed: {seed}"
+        if job.cancelled: res = "Cancelled. " + res
+        job.post(self.lbl_result.config, text=res, bootstyle="success" if passed_count==total else "danger")
+        report_data = [(int(l), int(r), N, int(f), s) for l, r, f, s in zip(ls, rs, failures, min_slack)]
+        if profile is not None:
+            path = os.path.join(self.output_dir, f"Bounds_Windows_Stages_n{n}_{self.get_timestamp()}_seed{seed}.json")
+            stage_report.save_stages(path, profile, theorem="bounds", n=n, samples=N, seed=seed, field=field, all_windows=True)
+        job.post(self.show_report, n, report_data, profile)
+
+    def show_report(self, n, data, profile=None):
+        top = ttk.Toplevel()
+        top.title("Window Sweep Report")
+        top.geometry("600x400")
+        ttk.Label(top, text=f"Per-Window Slack Table (n={n})", font=("Helvetica", 14, "bold")).pack(pady=10)
+        
+        cols = ("Window [l, r]", "Matrices", "Failures", "Min Slack")
+        tree = ttk.Treeview(top, columns=cols, show="headings", height=15)
+        for col in cols:
+            tree.heading(col, text=col)
+            tree.column(col, anchor=CENTER, width=120)
+        
+        for l, r, total, fails, slack in data:
+            tag = "fail" if fails > 0 else "pass"
+            tree.insert("", "end", values=(f"[{l},{r}]", total, fails, f"{slack:.2e}"), tags=(tag,))
+        
+        tree.tag_configure("fail", foreground="red")
+        tree.tag_configure("pass", foreground="green")
+        tree.pack(fill=BOTH, expand=True, padx=10, pady=10)
+        if profile is not None:
+            top.geometry("760x640")
+            stage_report.add_stage_table(top, profile)
+        ttk.Button(top, text="Close", command=top.destroy, bootstyle="secondary").pack(pady=10)
\ No newline at end of file
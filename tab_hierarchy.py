@@ -1,12 +1,7 @@
 # 文件名: tab_hierarchy.py
 import os
-import threading
 import datetime # <--- 新增
 import numpy as np
-import matplotlib.pyplot as plt
-from matplotlib.figure import Figure
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-from scipy.special import comb
 
 try:
     import ttkbootstrap as ttk
@@ -19,15 +14,33 @@ except ImportError:
 
 import matrix_utils as utils
 import theorem_texts as txt
+import banner_cache
+import audits
+import result_sink
+import checkpoint
+import stage_report
+from progress import TabJob
+from plot_worker import PlotWorker
 
 class HierarchyTab:
-    def __init__(self, notebook, output_dir):
+    def __init__(self, notebook, output_dir, status=None):
         self.output_dir = output_dir
+        self.status = status # 主窗口状态栏回调 (PNG 写完后报告路径)
         self.frame = ttk.Frame(notebook, padding=10)
         notebook.add(self.frame, text="Theorem 4.1: Hierarchy")
+        # 界面 (含 matplotlib 图和 LaTeX 横幅) 在第一次切到该 Tab 时才构建, 见 main.py
+        self.built = False
+
+    def build(self):
+        if self.built: return
+        self.built = True
         self.init_ui()
 
     def init_ui(self):
+        # matplotlib 延迟到构建界面时才导入
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+
         paned = ttk.Panedwindow(self.frame, orient=HORIZONTAL)
         paned.pack(fill=BOTH, expand=True)
         
@@ -44,23 +57,27 @@ class HierarchyTab:
         
         latex_frame = ttk.Frame(right_panel)
         latex_frame.pack(fill=X, padx=5, pady=2)
-        self.fig_latex = Figure(figsize=(8, 1), dpi=100)
-        try: self.fig_latex.patch.set_facecolor('#f8f9fa')
-        except: pass
-        ax_lat = self.fig_latex.add_subplot(111)
-        ax_lat.axis('off')
-        ax_lat.text(0.5, 0.5, txt.THM4_1_LATEX, fontsize=14, ha='center', va='center')
-        self.canvas_latex = FigureCanvasTkAgg(self.fig_latex, master=latex_frame)
-        self.canvas_latex.draw()
-        self.canvas_latex.get_tk_widget().pack(fill=BOTH, expand=True)
+        # 静态横幅: 渲染结果按内容哈希缓存成 PNG, 之后直接用 PhotoImage 显示
+        self.img_latex = banner_cache.banner_photo(latex_frame, os.path.join(self.output_dir, ".banner_cache"), "thm4_1",
+                                                   txt.THM4_1_LATEX, figsize=(8, 1), fontsize=14)
+        ttk.Label(latex_frame, image=self.img_latex, anchor=CENTER).pack(fill=BOTH, expand=True)
 
         plot_frame = ttk.Labelframe(right_panel, text="Single Visualization", padding=5)
         plot_frame.pack(fill=BOTH, expand=True, padx=5, pady=5)
         self.fig_plot = Figure(figsize=(5, 4), dpi=100)
         self.canvas_plot = FigureCanvasTkAgg(self.fig_plot, master=plot_frame)
         self.canvas_plot.get_tk_widget().pack(fill=BOTH, expand=True)
+        # 单次检验的计算、渲染和导出都在后台线程, 连点只保留最后一次
+        self.plotter = PlotWorker(self.canvas_plot, self.status)
 
         # Left
+        # 随机矩阵的数域, 单次检验和批量检验共用; 实对称矩阵走实数 LAPACK 例程
+        field_frame = ttk.Labelframe(left_panel, text="Matrix Field", padding=10)
+        field_frame.pack(fill=X, padx=5, pady=5)
+        self.var_field = ttk.StringVar(value="complex")
+        ttk.Radiobutton(field_frame, text="Complex Hermitian", value="complex", variable=self.var_field).pack(anchor=W)
+        ttk.Radiobutton(field_frame, text="Real symmetric", value="real", variable=self.var_field).pack(anchor=W)
+
         ctrl_frame = ttk.Labelframe(left_panel, text="Single Check", padding=10)
         ctrl_frame.pack(fill=X, padx=5, pady=5)
         ttk.Label(ctrl_frame, text="Dimension (n):").pack(anchor=W)
@@ -102,15 +119,30 @@ class HierarchyTab:
         self.spin_iter = ttk.Spinbox(mass_frame, from_=100, to=10000, increment=100)
         self.spin_iter.set(500)
         self.spin_iter.pack(fill=X, pady=5)
+        # 每个矩阵的 1..n-1 阶子矩阵谱只算一次, 检验全部 (m, k); 报告里多一张 m x k 的违背网格
+        self.var_all_pairs = ttk.BooleanVar(value=False)
+        ttk.Checkbutton(mass_frame, text="Check all (m, k) pairs per matrix", variable=self.var_all_pairs).pack(anchor=W)
+        # 各阶段 (生成 / 取子矩阵 / eigvalsh / 部分和) 的耗时直方图, 不勾选时没有任何开销
+        self.var_stages = ttk.BooleanVar(value=False)
+        ttk.Checkbutton(mass_frame, text="Record stage timings", variable=self.var_stages).pack(anchor=W)
         
         self.btn_mass = ttk.Button(mass_frame, text="Run Range Scan", bootstyle="danger-outline", 
                                    command=self.run_scan_thread)
         self.btn_mass.pack(fill=X, pady=10)
+        # 中断 (关窗口 / 崩溃) 后从 output 目录里的断点文件继续
+        self.btn_resume = ttk.Button(mass_frame, text="Resume Last Scan", bootstyle="secondary-outline", 
+                                     command=lambda: self.run_scan_thread(resume=True))
+        self.btn_resume.pack(fill=X, pady=(0, 10))
+        # 取消时先写断点, 之后可以 Resume
+        self.btn_cancel = ttk.Button(mass_frame, text="Cancel", bootstyle="secondary-outline")
+        self.btn_cancel.pack(fill=X, pady=(0, 10))
         
         self.progress = ttk.Progressbar(mass_frame, bootstyle="info-striped")
         self.progress.pack(fill=X, pady=5)
         self.lbl_result = ttk.Label(mass_frame, text="Status: Idle", font=("Consolas", 9))
         self.lbl_result.pack(fill=X)
+        # 后台任务: 进度经队列回到主线程刷新, 同时只允许一个任务
+        self.job = TabJob(self.frame, self.progress, self.lbl_result, [self.btn_mass, self.btn_resume], self.btn_cancel)
 
     def get_timestamp(self):
         return datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -121,80 +153,139 @@ class HierarchyTab:
             m = int(self.spin_m.get())
             k = int(self.spin_k.get())
             if k >= m or m >= n: return
-
-            passed, v_left, v_right, viol = utils.check_hierarchy_theorem(n, m, k)
-            
-            self.fig_plot.clear()
-            ax1 = self.fig_plot.add_subplot(111)
-            ax1.plot(np.cumsum(v_left), label=f'Size {m}', color='#1f77b4', linewidth=2)
-            ax1.plot(np.cumsum(v_right), label=f'Size {k}', color='#ff7f0e', linestyle='--', linewidth=2)
-            ax1.fill_between(range(len(v_left)), np.cumsum(v_left), np.cumsum(v_right), color='green', alpha=0.1)
-            ax1.set_title(f"Check n={n}, m={m}, k={k}")
-            ax1.legend()
-            self.fig_plot.tight_layout()
-            self.canvas_plot.draw()
-            
-            # --- 保存逻辑 ---
-            filename = f"Hierarchy_Check_n{n}_{self.get_timestamp()}.png"
-            path = os.path.join(self.output_dir, filename)
-            self.fig_plot.savefig(path, dpi=150)
-            print(f"[Output] Plot saved to: {os.path.abspath(path)}")
-            
-        except Exception as e:
+        except ValueError as e:
             print(e)
+            return
+        path = os.path.join(self.output_dir, f"Hierarchy_Check_n{n}_{self.get_timestamp()}.png")
+        self.plotter.request(self.plot_single, path, n, m, k, self.var_field.get())
 
-    def run_scan_thread(self):
-        threading.Thread(target=self.run_scan, daemon=True).start()
+    def plot_single(self, fig, n, m, k, field="complex"):
+        # 在 PlotWorker 的工作线程里执行: 只画到传入的 fig 上, 不碰 Tk 控件
+        passed, t, cum_left, cum_right, viol = utils.check_hierarchy_theorem(n, m, k, field=field)
+        
+        # 部分和曲线在断点之间是线性的, 只画断点即为精确曲线
+        ax1 = fig.add_subplot(111)
+        ax1.plot(t, cum_left, label=f'Size {m}', color='#1f77b4', linewidth=2)
+        ax1.plot(t, cum_right, label=f'Size {k}', color='#ff7f0e', linestyle='--', linewidth=2)
+        ax1.fill_between(t, cum_left, cum_right, color='green', alpha=0.1)
+        ax1.set_title(f"Check n={n}, m={m}, k={k} ({field})")
+        ax1.legend()
+        fig.tight_layout()
 
-    def run_scan(self):
+    def run_scan_thread(self, resume=False):
+        # 控件只在主线程读取; 已有任务在跑时 start 直接忽略
         try:
-            min_n = int(self.spin_min_n.get())
-            max_n = int(self.spin_max_n.get())
-            samples = int(self.spin_iter.get())
-            
-            if min_n > max_n: return
+            params = (int(self.spin_min_n.get()), int(self.spin_max_n.get()), int(self.spin_iter.get()), self.var_stages.get(),
+                      self.var_field.get(), self.var_all_pairs.get())
+        except ValueError as e:
+            self.lbl_result.config(text=f"Error: {e}")
+            return
+        self.job.start(self.run_scan, resume, params)
 
-            self.btn_mass.config(state="disabled")
-            self.lbl_result.config(text="Scanning...", bootstyle="warning")
-            
-            report_data = []
+    def checkpoint_path(self):
+        return os.path.join(self.output_dir, "hierarchy_scan.ckpt.json")
+
+    def run_scan(self, resume, params):
+        job = self.job
+        try:
+            state = checkpoint.load_state(self.checkpoint_path()) if resume else None
+            if resume and state is None:
+                job.post(self.lbl_result.config, text="No checkpoint to resume.", bootstyle="secondary")
+                return
+            if state is None:
+                min_n, max_n, samples, stages, field, all_pairs = params
+                if min_n > max_n:
+                    job.post(self.lbl_result.config, text="Min n must not exceed Max n.", bootstyle="secondary")
+                    return
+                seed = audits.new_run_seed()
+                samples_dir = result_sink.create_columns(
+                    os.path.join(self.output_dir, f"Hierarchy_Samples_{self.get_timestamp()}_seed{seed}"),
+                    "hierarchy", seed, (max_n - min_n + 1) * samples, field)
+                state = {"min_n": min_n, "max_n": max_n, "samples": samples, "seed": seed, "field": field, "all_pairs": all_pairs,
+                         "samples_dir": samples_dir, "n": min_n, "i": 0, "failures": 0, "max_violation": 0.0, "report": [],
+                         "grid": None, "grids": {},
+                         "stages": utils.StageProfile().to_dict() if stages else None}
+            # 从断点继续时参数全部取自断点文件; 下一个样本是 (n, i), 已完成的 n 在 report 里
+            min_n, max_n, samples = state["min_n"], state["max_n"], state["samples"]
+            seed, samples_dir = state["seed"], state["samples_dir"]
+            field = state.get("field", "complex") # 旧断点没有该字段, 当时只有复数域
+            all_pairs = state.get("all_pairs", False) # 同上, 当时只有逐样本随机 (m, k)
+            # 阶段计时随断点保存, 继续时接着累计 (是否记录也以断点为准)
+            profile = None if state.get("stages") is None else utils.StageProfile.from_dict(state["stages"])
+
+            print(f"[Run] Hierarchy range scan, n={min_n}..{max_n}, field={field}, seed={seed}"
+                  + (", all (m, k) pairs" if all_pairs else "")
+                  + (f" (resumed at n={state['n']}, sample {state['i']})" if resume else ""))
+            report_data = [tuple(row) for row in state["report"]]
+            # 全部 (m, k) 模式下每个 n 一张网格: grid[m, k] 为该对在各样本上的最大违背
+            grids = {int(n): np.array(g) for n, g in state.get("grids", {}).items()}
+            grid = None
             total_steps = (max_n - min_n + 1) * samples
-            current_step = 0
+            current_step = (state["n"] - min_n) * samples + state["i"]
+            sink = result_sink.ResultSink(samples_dir, offset=current_step)
+            job.set_total(total_steps, current_step)
+
+            def save_checkpoint(n, i, failures, max_violation):
+                sink.sync()
+                state.update(n=n, i=i, failures=failures, max_violation=max_violation, report=report_data,
+                             grid=None if grid is None or i == 0 else grid.tolist(),
+                             grids={str(m): g.tolist() for m, g in grids.items()},
+                             stages=None if profile is None else profile.to_dict())
+                checkpoint.save_state(self.checkpoint_path(), state)
             
-            for n in range(min_n, max_n + 1):
-                failures = 0
-                max_violation = 0.0
+            with utils.collect_stages(profile):
+                for n in range(state["n"], max_n + 1):
+                    resumed = (n == state["n"])
+                    failures = state["failures"] if resumed else 0
+                    max_violation = state["max_violation"] if resumed else 0.0
+                    if all_pairs:
+                        ms, ks = utils.hierarchy_pairs(n)
+                        grid = np.array(state["grid"]) if resumed and state.get("grid") is not None else np.zeros((n, n))
                 
-                for i in range(samples):
-                    if n < 3: break 
-                    m = np.random.randint(2, n)
-                    k = np.random.randint(1, m)
-                    
-                    passed, _, _, viol = utils.check_hierarchy_theorem(n, m, k)
+                    job.stage = f"Testing n={n}"
+                    for i in range(state["i"] if resumed else 0, samples):
+                        if n < 3: break 
+                        if job.cancelled:
+                            save_checkpoint(n, i, failures, max_violation)
+                            sink.close()
+                            job.post(self.lbl_result.config, text=f"Cancelled at n={n}, sample {i}.\nCheckpoint saved; Resume to continue.",
+                                     bootstyle="secondary")
+                            return
+                        # 样本 (seed, n, i) 可用 audit_cli replay 单独重放 (全部 (m, k) 模式用 audits.sample_hierarchy_pairs)
+                        rng = audits.sample_rng("hierarchy", n, seed, i)
+                        if all_pairs:
+                            passed, viol, slack, params, values, violations = audits.sample_hierarchy_pairs(n, rng, field)
+                            grid[ms, ks] = np.maximum(grid[ms, ks], violations)
+                        else:
+                            passed, viol, slack, params, values = audits.sample_hierarchy(n, rng, field)
+                        sink.append(n, params, i, passed, viol, slack, values)
                     
-                    if not passed:
-                        failures += 1
-                        max_violation = max(max_violation, viol)
+                        if not passed:
+                            failures += 1
+                            max_violation = max(max_violation, viol)
                     
-                    current_step += 1
-                    if current_step % 50 == 0:
-                        progress_val = (current_step / total_steps) * 100
-                        self.progress['value'] = progress_val
-                        self.lbl_result.config(text=f"Testing n={n} ({i}/{samples})...")
+                        current_step += 1
+                        job.done = current_step
+                        if (i + 1) % checkpoint.CHECKPOINT_EVERY == 0:
+                            save_checkpoint(n, i + 1, failures, max_violation)
                 
-                report_data.append((n, samples, failures, max_violation))
+                    report_data.append((n, samples, failures, max_violation))
+                    if all_pairs and n >= 3: grids[n] = grid
+                    save_checkpoint(n + 1, 0, 0, 0.0)
 
-            self.progress['value'] = 100
-            self.lbl_result.config(text="Scan Complete!", bootstyle="success")
-            
-            self.frame.after(0, lambda: self.show_report(report_data))
+            result_sink.finish(samples_dir, sink.close())
+            checkpoint.clear_state(self.checkpoint_path())
+            print(f"[Output] Per-sample columns saved to: {os.path.abspath(samples_dir)}")
+            if profile is not None:
+                stage_report.save_stages(os.path.join(samples_dir, stage_report.STAGES_FILE), profile,
+                                         theorem="hierarchy", min_n=min_n, max_n=max_n, samples=samples, seed=seed, field=field)
+            job.post(self.lbl_result.config, text=f"Scan Complete! Seed: {seed}", bootstyle="success")
+            job.post(self.show_report, report_data, profile, grids)
             
         except Exception as e:
-            self.lbl_result.config(text=f"Error: {e}")
-        finally:
-            self.btn_mass.config(state="normal")
+            job.post(self.lbl_result.config, text=f"Error: {e}", bootstyle="danger")
 
-    def show_report(self, data):
+    def show_report(self, data, profile=None, grids=None):
         top = ttk.Toplevel()
         top.title("Massive Validation Report")
         top.geometry("600x400")
@@ -218,4 +309,44 @@ class HierarchyTab:
         tree.tag_configure("pass", foreground="green")
         
         tree.pack(fill=BOTH, expand=True, padx=10, pady=10)
-        ttk.Button(top, text="Close", command=top.destroy, bootstyle="secondary").pack(pady=10)
\ No newline at end of file
+        if grids:
+            top.geometry("900x760")
+            self.add_violation_grid(top, grids)
+        if profile is not None:
+            top.geometry("900x960" if grids else "760x640")
+            stage_report.add_stage_table(top, profile)
+        ttk.Button(top, text="Close", command=top.destroy, bootstyle="secondary").pack(pady=10)
+
+    def add_violation_grid(self, parent, grids):
+        """全部 (m, k) 模式的违背网格: 行为 m, 列为 k, 格内为该对在各样本上的最大违背; 下拉框切换 n"""
+        frame = ttk.Labelframe(parent, text="Violation Grid (max over samples; rows m, columns k)", padding=5)
+        frame.pack(fill=BOTH, expand=True, padx=10, pady=5)
+        dims = sorted(grids)
+        var_n = ttk.StringVar(value=str(dims[-1]))
+        row = ttk.Frame(frame)
+        row.pack(fill=X)
+        ttk.Label(row, text="n:").pack(side=LEFT)
+        combo = ttk.Combobox(row, textvariable=var_n, values=[str(n) for n in dims], state="readonly", width=6)
+        combo.pack(side=LEFT, padx=5)
+        holder = ttk.Frame(frame)
+        holder.pack(fill=BOTH, expand=True, pady=5)
+
+        def draw(*_):
+            for child in holder.winfo_children(): child.destroy()
+            n = int(var_n.get())
+            grid = grids[n]
+            cols = ["m"] + [str(k) for k in range(1, n - 1)]
+            tree = ttk.Treeview(holder, columns=cols, show="headings", height=n - 2)
+            for col in cols:
+                tree.heading(col, text="m \\ k" if col == "m" else col)
+                tree.column(col, anchor=CENTER, width=70)
+            for m in range(2, n):
+                # k >= m 不是合法的对, 留空
+                cells = [(f"{grid[m, k]:.1e}" if grid[m, k] > 0 else "0") if k < m else "" for k in range(1, n - 1)]
+                tree.insert("", "end", values=[m] + cells, tags=("fail" if np.any(grid[m, 1:m] > 0) else "pass",))
+            tree.tag_configure("fail", foreground="red")
+            tree.tag_configure("pass", foreground="green")
+            tree.pack(fill=BOTH, expand=True)
+
+        combo.bind("<<ComboboxSelected>>", draw)
+        draw()
\ No newline at end of file
@@ -1,12 +1,8 @@
 # 文件名: tab_lemma.py
 import os
-import threading
 import datetime
 import csv
 import numpy as np
-import matplotlib.pyplot as plt
-from matplotlib.figure import Figure
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 
 try:
     import ttkbootstrap as ttk
@@ -18,15 +14,32 @@ from tkinter import messagebox
 
 import matrix_utils as utils
 import theorem_texts as txt
+import banner_cache
+import audits
+import result_sink
+import stage_report
+from progress import TabJob
+from plot_worker import PlotWorker
 
 class LemmaTab:
-    def __init__(self, notebook, output_dir):
+    def __init__(self, notebook, output_dir, status=None):
         self.output_dir = output_dir
+        self.status = status # 主窗口状态栏回调 (PNG 写完后报告路径)
         self.frame = ttk.Frame(notebook, padding=10)
         notebook.add(self.frame, text="Lemma 3.1: Polynomial")
+        # 界面 (含 matplotlib 图和 LaTeX 横幅) 在第一次切到该 Tab 时才构建, 见 main.py
+        self.built = False
+
+    def build(self):
+        if self.built: return
+        self.built = True
         self.init_ui()
 
     def init_ui(self):
+        # matplotlib 延迟到构建界面时才导入
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+
         paned = ttk.Panedwindow(self.frame, orient=HORIZONTAL)
         paned.pack(fill=BOTH, expand=True)
         
@@ -43,15 +56,10 @@ class LemmaTab:
         # LaTeX
         latex_frame = ttk.Frame(right_panel)
         latex_frame.pack(fill=X, padx=5, pady=2)
-        self.fig_latex = Figure(figsize=(8, 1), dpi=100)
-        try: self.fig_latex.patch.set_facecolor('#f8f9fa')
-        except: pass
-        ax_lat = self.fig_latex.add_subplot(111)
-        ax_lat.axis('off')
-        ax_lat.text(0.5, 0.5, txt.LEMMA3_1_LATEX, fontsize=14, ha='center', va='center')
-        self.canvas_latex = FigureCanvasTkAgg(self.fig_latex, master=latex_frame)
-        self.canvas_latex.draw()
-        self.canvas_latex.get_tk_widget().pack(fill=BOTH, expand=True)
+        # 静态横幅: 渲染结果按内容哈希缓存成 PNG, 之后直接用 PhotoImage 显示
+        self.img_latex = banner_cache.banner_photo(latex_frame, os.path.join(self.output_dir, ".banner_cache"), "lemma3_1",
+                                                   txt.LEMMA3_1_LATEX, figsize=(8, 1), fontsize=14)
+        ttk.Label(latex_frame, image=self.img_latex, anchor=CENTER).pack(fill=BOTH, expand=True)
 
         # Plot
         plot_frame = ttk.Labelframe(right_panel, text="Polynomial Roots Visualization", padding=5)
@@ -59,15 +67,22 @@ class LemmaTab:
         self.fig_plot = Figure(figsize=(5, 4), dpi=100)
         self.canvas_plot = FigureCanvasTkAgg(self.fig_plot, master=plot_frame)
         self.canvas_plot.get_tk_widget().pack(fill=BOTH, expand=True)
+        # 单次检验的计算、渲染和导出都在后台线程, 连点只保留最后一次
+        self.plotter = PlotWorker(self.canvas_plot, self.status, lambda e: messagebox.showerror("Error", str(e)))
 
         # Left: Controls
         ctrl_frame = ttk.Labelframe(left_panel, text="Visualization", padding=10)
         ctrl_frame.pack(fill=X, padx=5, pady=5)
         
         ttk.Label(ctrl_frame, text="Dimension (n):").pack(anchor=W)
-        self.spin_n = ttk.Spinbox(ctrl_frame, from_=3, to=8) # 多项式画图不宜过高维，否则震荡太大
+        self.spin_n = ttk.Spinbox(ctrl_frame, from_=3, to=30) # 高维时曲线幅度很大, 但求值已向量化
         self.spin_n.set(5)
         self.spin_n.pack(fill=X, pady=5)
+        # 普通模式随机矩阵与投影向量的数域 (地狱模式的输入本来就是实数, 不受影响)
+        ttk.Label(ctrl_frame, text="Matrix Field:").pack(anchor=W)
+        self.var_field = ttk.StringVar(value="complex")
+        ttk.Radiobutton(ctrl_frame, text="Complex Hermitian", value="complex", variable=self.var_field).pack(anchor=W)
+        ttk.Radiobutton(ctrl_frame, text="Real symmetric", value="real", variable=self.var_field).pack(anchor=W)
         
         ttk.Button(ctrl_frame, text="Generate & Plot", bootstyle="info", 
                    command=self.run_single).pack(fill=X, pady=10)
@@ -76,18 +91,31 @@ class LemmaTab:
         mass_frame = ttk.Labelframe(left_panel, text="Hell Mode Audit", padding=10)
         mass_frame.pack(fill=X, padx=5, pady=20)
         
+        ttk.Label(mass_frame, text="Max Dimension (n):").pack(anchor=W)
+        self.spin_max_n = ttk.Spinbox(mass_frame, from_=3, to=30)
+        self.spin_max_n.set(9)
+        self.spin_max_n.pack(fill=X, pady=5)
+        
         ttk.Label(mass_frame, text="Samples:").pack(anchor=W)
         self.spin_iter = ttk.Spinbox(mass_frame, from_=100, to=10000, increment=100)
         self.spin_iter.set(1000)
         self.spin_iter.pack(fill=X, pady=5)
+        # 各阶段 (生成 / null_space / eigvalsh / 残差) 的耗时直方图, 不勾选时没有任何开销
+        self.var_stages = ttk.BooleanVar(value=False)
+        ttk.Checkbutton(mass_frame, text="Record stage timings", variable=self.var_stages).pack(anchor=W)
         
-        ttk.Button(mass_frame, text="Run Audit", bootstyle="danger-outline", 
-                   command=self.run_audit_thread).pack(fill=X, pady=10)
+        self.btn_mass = ttk.Button(mass_frame, text="Run Audit", bootstyle="danger-outline", 
+                                   command=self.run_audit_thread)
+        self.btn_mass.pack(fill=X, pady=10)
+        self.btn_cancel = ttk.Button(mass_frame, text="Cancel", bootstyle="secondary-outline")
+        self.btn_cancel.pack(fill=X, pady=(0, 10))
         
         self.progress = ttk.Progressbar(mass_frame, bootstyle="info-striped")
         self.progress.pack(fill=X, pady=5)
         self.lbl_result = ttk.Label(mass_frame, text="Status: Idle", font=("Consolas", 10))
         self.lbl_result.pack(fill=X)
+        # 后台任务: 进度经队列回到主线程刷新, 同时只允许一个任务 (以前连点会并行跑两个审计)
+        self.job = TabJob(self.frame, self.progress, self.lbl_result, [self.btn_mass], self.btn_cancel)
 
     def get_timestamp(self):
         return datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -95,65 +123,84 @@ class LemmaTab:
     def run_single(self):
         try:
             n = int(self.spin_n.get())
-            passed, lambdas, mus, poly_func, x_rng, _ = utils.check_lemma_polynomial(n, stress_mode=False)
-            
-            self.fig_plot.clear()
-            ax = self.fig_plot.add_subplot(111)
-            
-            # 画多项式曲线
-            x_vals = np.linspace(x_rng[0], x_rng[1], 400)
-            y_vals = poly_func(x_vals)
-            ax.plot(x_vals, y_vals, label=r'$P(x)$', color='black', linewidth=1.5)
-            
-            # 画零轴
-            ax.axhline(0, color='gray', linestyle='--', alpha=0.5)
-            
-            # 标记原特征值 lambda (极点/间隔点)
-            ax.plot(lambdas, np.zeros_like(lambdas), 'x', color='blue', markersize=8, label=r'$\lambda$ (Original)')
-            
-            # 标记几何特征值 mu (应该在零点)
-            ax.plot(mus, np.zeros_like(mus), 'o', color='red', markersize=8, label=r'$\mu$ (Projected)')
-            
-            ax.set_title(f"Lemma 3.1 Check (n={n})")
-            ax.legend()
-            ax.grid(alpha=0.3)
-            
-            self.fig_plot.tight_layout()
-            self.canvas_plot.draw()
-            
-            # 保存
-            filename = f"Lemma31_Check_n{n}_{self.get_timestamp()}.png"
-            path = os.path.join(self.output_dir, filename)
-            self.fig_plot.savefig(path, dpi=150)
-            print(f"[Output] Lemma Plot saved to: {os.path.abspath(path)}")
-            
-        except Exception as e:
+        except ValueError as e:
             messagebox.showerror("Error", str(e))
+            return
+        path = os.path.join(self.output_dir, f"Lemma31_Check_n{n}_{self.get_timestamp()}.png")
+        self.plotter.request(self.plot_single, path, n, self.var_field.get())
 
-    def run_audit_thread(self):
-        threading.Thread(target=self.run_audit, daemon=True).start()
+    def plot_single(self, fig, n, field="complex"):
+        # 在 PlotWorker 的工作线程里执行: 只画到传入的 fig 上, 不碰 Tk 控件
+        passed, lambdas, mus, poly_func, x_rng, _ = utils.check_lemma_polynomial(n, stress_mode=False, field=field)
+        
+        ax = fig.add_subplot(111)
+        
+        # 画多项式曲线
+        x_vals = np.linspace(x_rng[0], x_rng[1], 400)
+        y_vals = poly_func(x_vals)
+        ax.plot(x_vals, y_vals, label=r'$P(x)$', color='black', linewidth=1.5)
+        
+        # 画零轴
+        ax.axhline(0, color='gray', linestyle='--', alpha=0.5)
+        
+        # 标记原特征值 lambda (极点/间隔点)
+        ax.plot(lambdas, np.zeros_like(lambdas), 'x', color='blue', markersize=8, label=r'$\lambda$ (Original)')
+        
+        # 标记几何特征值 mu (应该在零点)
+        ax.plot(mus, np.zeros_like(mus), 'o', color='red', markersize=8, label=r'$\mu$ (Projected)')
+        
+        ax.set_title(f"Lemma 3.1 Check (n={n}, {field})")
+        ax.legend()
+        ax.grid(alpha=0.3)
+        
+        fig.tight_layout()
 
-    def run_audit(self):
+    def run_audit_thread(self):
+        # 控件只在主线程读取; 已有任务在跑时 start 直接忽略
         try:
             N = int(self.spin_iter.get())
-            self.lbl_result.config(text="Auditing...", bootstyle="warning")
-            self.progress['value'] = 0
-            
+            max_n = int(self.spin_max_n.get())
+        except ValueError as e:
+            self.lbl_result.config(text=str(e))
+            return
+        self.job.start(self.run_audit, N, max_n, self.var_stages.get())
+
+    def run_audit(self, N, max_n, stages):
+        job = self.job
+        try:
+            job.set_total(N)
+            job.stage = "Auditing"
+            seed = audits.new_run_seed()
+            print(f"[Run] Lemma 3.1 audit, n=3..{max_n}, seed={seed}")
             passed_cnt = 0
             max_global_res = 0.0
+            # 逐样本结果 (n, 残差, 阈值) 写进预分配的 .npy 列
+            samples_dir = result_sink.create_columns(
+                os.path.join(self.output_dir, f"Lemma_Samples_{self.get_timestamp()}_seed{seed}"), "lemma", seed, N)
+            sink = result_sink.ResultSink(samples_dir)
+            profile = utils.StageProfile() if stages else None
             
-            for i in range(N):
-                # 随机 n
-                n = np.random.randint(3, 10)
-                is_pass, _, _, _, _, res = utils.check_lemma_polynomial(n, stress_mode=True)
-                if is_pass: passed_cnt += 1
-                max_global_res = max(max_global_res, res)
-                
-                if i % 50 == 0: self.progress['value'] = (i/N)*100
+            with utils.collect_stages(profile):
+                for i in range(N):
+                    if job.cancelled: break
+                    # 随机 n; 样本 (seed, n, i) 可用 audit_cli replay 单独重放
+                    n = audits.draw_lemma_n(seed, i, max_n)
+                    is_pass, res, slack, params, values = audits.sample_lemma(n, audits.sample_rng("lemma", n, seed, i))
+                    sink.append(n, params, i, is_pass, res, slack, values)
+                    if is_pass: passed_cnt += 1
+                    max_global_res = max(max_global_res, res)
+                    job.done = i + 1
             
-            self.progress['value'] = 100
-            res_str = f"Pass: {passed_cnt}/{N}\nMax Res: {max_global_res:.2e}"
-            self.lbl_result.config(text=res_str, bootstyle="success" if passed_cnt==N else "danger")
+            done = sink.close()
+            result_sink.finish(samples_dir, done)
+            print(f"[Output] Per-sample columns saved to: {os.path.abspath(samples_dir)}")
+            if profile is not None:
+                stage_report.save_stages(os.path.join(samples_dir, stage_report.STAGES_FILE), profile,
+                                         theorem="lemma", max_n=max_n, samples=done, seed=seed)
+                job.post(stage_report.show_stage_report, "Stage Timings (Lemma 3.1)", profile)
+            res_str = f"Pass: {passed_cnt}/{done}\nMax Res: {max_global_res:.2e}\nSeed: {seed}"
+            if job.cancelled: res_str = "Cancelled. " + res_str
+            job.post(self.lbl_result.config, text=res_str, bootstyle="success" if passed_cnt==done==N else "danger")
             
         except Exception as e:
-            self.lbl_result.config(text=str(e))
\ No newline at end of file
+            job.post(self.lbl_result.config, text=str(e), bootstyle="danger")
\ No newline at end of file
@@ -1,12 +1,7 @@
 # 文件名: tab_weighted.py
 import os
-import threading
 import datetime # <--- 新增时间戳
 import csv      # <--- 新增CSV导出
-import numpy as np
-import matplotlib.pyplot as plt
-from matplotlib.figure import Figure
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 
 try:
     import ttkbootstrap as ttk
@@ -18,15 +13,33 @@ from tkinter import messagebox
 
 import matrix_utils as utils
 import theorem_texts as txt
+import banner_cache
+import audits
+import result_sink
+import checkpoint
+import stage_report
+from progress import TabJob
+from plot_worker import PlotWorker
 
 class WeightedTab:
-    def __init__(self, notebook, output_dir):
+    def __init__(self, notebook, output_dir, status=None):
         self.output_dir = output_dir
+        self.status = status # 主窗口状态栏回调 (PNG 写完后报告路径)
         self.frame = ttk.Frame(notebook, padding=10)
         notebook.add(self.frame, text="Main Result: Weighted Bounds")
+        # 界面 (含 matplotlib 图和 LaTeX 横幅) 在第一次切到该 Tab 时才构建, 见 main.py
+        self.built = False
+
+    def build(self):
+        if self.built: return
+        self.built = True
         self.init_ui()
 
     def init_ui(self):
+        # matplotlib 延迟到构建界面时才导入
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+
         paned = ttk.Panedwindow(self.frame, orient=HORIZONTAL)
         paned.pack(fill=BOTH, expand=True)
         
@@ -43,21 +56,18 @@ class WeightedTab:
 
         latex_frame = ttk.Frame(right_panel)
         latex_frame.pack(fill=X, padx=5, pady=2)
-        self.fig_latex = Figure(figsize=(8, 1.5), dpi=100)
-        try: self.fig_latex.patch.set_facecolor('#f8f9fa')
-        except: pass
-        ax_lat = self.fig_latex.add_subplot(111)
-        ax_lat.axis('off')
-        ax_lat.text(0.5, 0.5, txt.THM2_2_LATEX, fontsize=13, ha='center', va='center')
-        self.canvas_latex = FigureCanvasTkAgg(self.fig_latex, master=latex_frame)
-        self.canvas_latex.draw()
-        self.canvas_latex.get_tk_widget().pack(fill=BOTH, expand=True)
+        # 静态横幅: 渲染结果按内容哈希缓存成 PNG, 之后直接用 PhotoImage 显示
+        self.img_latex = banner_cache.banner_photo(latex_frame, os.path.join(self.output_dir, ".banner_cache"), "thm2_2",
+                                                   txt.THM2_2_LATEX, figsize=(8, 1.5), fontsize=13)
+        ttk.Label(latex_frame, image=self.img_latex, anchor=CENTER).pack(fill=BOTH, expand=True)
 
         plot_frame = ttk.Labelframe(right_panel, text="Verification Plot", padding=5)
         plot_frame.pack(fill=BOTH, expand=True, padx=5, pady=5)
         self.fig_plot = Figure(figsize=(5, 4), dpi=100)
         self.canvas_plot = FigureCanvasTkAgg(self.fig_plot, master=plot_frame)
         self.canvas_plot.get_tk_widget().pack(fill=BOTH, expand=True)
+        # 单次检验的计算、渲染和导出都在后台线程, 连点只保留最后一次
+        self.plotter = PlotWorker(self.canvas_plot, self.status, lambda e: messagebox.showerror("Error", str(e)))
 
         # Left Controls
         ctrl_frame = ttk.Labelframe(left_panel, text="Single Check (Normal Mode)", padding=10)
@@ -76,6 +86,11 @@ class WeightedTab:
         self.spin_r = ttk.Spinbox(ctrl_frame, from_=1, to=10)
         self.spin_r.set(3)
         self.spin_r.pack(fill=X, pady=5)
+        # 普通模式随机矩阵与投影向量的数域 (地狱模式的输入本来就是实数, 不受影响)
+        ttk.Label(ctrl_frame, text="Matrix Field:").pack(anchor=W)
+        self.var_field = ttk.StringVar(value="complex")
+        ttk.Radiobutton(ctrl_frame, text="Complex Hermitian", value="complex", variable=self.var_field).pack(anchor=W)
+        ttk.Radiobutton(ctrl_frame, text="Real symmetric", value="real", variable=self.var_field).pack(anchor=W)
         
         # 按钮文案改了一下，提示会保存
         ttk.Button(ctrl_frame, text="Generate & Save Plot", bootstyle="primary", 
@@ -105,14 +120,30 @@ class WeightedTab:
         
         ttk.Label(mass_frame, text="*Includes Repeated Roots & Zero Weights", 
                   font=("Arial", 8, "italic"), bootstyle="secondary").pack(anchor=W)
+        # 每个样本的谱只算一次, 用前缀和检验全部 (l, r) 窗口; 逐样本结果记录最紧的窗口
+        self.var_all_windows = ttk.BooleanVar(value=False)
+        ttk.Checkbutton(mass_frame, text="Check all (l, r) windows per sample",
+                        variable=self.var_all_windows).pack(anchor=W, pady=(5, 0))
+        # 各阶段 (生成 / null_space / eigvalsh / 界) 的耗时直方图, 不勾选时没有任何开销
+        self.var_stages = ttk.BooleanVar(value=False)
+        ttk.Checkbutton(mass_frame, text="Record stage timings", variable=self.var_stages).pack(anchor=W, pady=(5, 0))
                   
         self.btn_mass = ttk.Button(mass_frame, text="Run Audit & Export CSV", bootstyle="danger-outline", 
                                    command=self.run_audit_thread)
         self.btn_mass.pack(fill=X, pady=10)
+        # 中断 (关窗口 / 崩溃) 后从 output 目录里的断点文件继续
+        self.btn_resume = ttk.Button(mass_frame, text="Resume Last Audit", bootstyle="secondary-outline", 
+                                     command=lambda: self.run_audit_thread(resume=True))
+        self.btn_resume.pack(fill=X, pady=(0, 10))
+        # 取消时先写断点, 之后可以 Resume
+        self.btn_cancel = ttk.Button(mass_frame, text="Cancel", bootstyle="secondary-outline")
+        self.btn_cancel.pack(fill=X, pady=(0, 10))
         self.progress = ttk.Progressbar(mass_frame, bootstyle="warning-striped")
         self.progress.pack(fill=X, pady=5)
         self.lbl_result = ttk.Label(mass_frame, text="Status: Idle", font=("Consolas", 10))
         self.lbl_result.pack(fill=X)
+        # 后台任务: 进度经队列回到主线程刷新, 同时只允许一个任务
+        self.job = TabJob(self.frame, self.progress, self.lbl_result, [self.btn_mass, self.btn_resume], self.btn_cancel)
 
     def update_window_limits(self):
         try:
@@ -131,84 +162,123 @@ class WeightedTab:
             l = int(self.spin_l.get()) - 1
             r = int(self.spin_r.get()) - 1
             if l > r or r >= n: return
-
-            passed, val, lb, ub, viol = utils.check_weighted_theorem(n, l, r, stress_mode=False)
-            
-            self.fig_plot.clear()
-            ax = self.fig_plot.add_subplot(111)
-            y_pos = 1
-            ax.errorbar(val, y_pos, xerr=0, fmt='o', color='#d62728', markersize=10, label=r'Actual $\sum \mu$')
-            ax.plot([lb, ub], [y_pos, y_pos], '|--', color='blue', linewidth=3, markersize=15, label='Theoretical Bounds')
-            
-            title_text = f"Check n={n}, Window=[{l+1}, {r+1}]\nLHS={lb:.4f} <= Actual={val:.4f} <= RHS={ub:.4f}"
-            ax.set_title(title_text, fontsize=11)
-            ax.set_yticks([])
-            ax.legend(loc='upper right')
-            margin = (ub - lb) * 0.2 if ub != lb else 0.5
-            ax.set_xlim(lb - margin, ub + margin)
-            ax.set_ylim(0.8, 1.2)
-            self.fig_plot.tight_layout()
-            self.canvas_plot.draw()
-
-            # --- 导出逻辑 ---
-            # 1. 构造文件名 (带时间戳)
-            filename = f"Weighted_Check_n{n}_w{l+1}-{r+1}_{self.get_timestamp()}.png"
-            filepath = os.path.join(self.output_dir, filename)
-            
-            # 2. 保存
-            self.fig_plot.savefig(filepath, dpi=150)
-            
-            # 3. 严格遵守你的规则：显示绝对路径
-            abs_path = os.path.abspath(filepath)
-            print(f"[Output] Plot saved to: {abs_path}")
-            
-        except Exception as e:
+        except ValueError as e:
             messagebox.showerror("Error", str(e))
+            return
+        path = os.path.join(self.output_dir, f"Weighted_Check_n{n}_w{l+1}-{r+1}_{self.get_timestamp()}.png")
+        self.plotter.request(self.plot_single, path, n, l, r, self.var_field.get())
 
-    def run_audit_thread(self):
-        threading.Thread(target=self.run_audit, daemon=True).start()
+    def plot_single(self, fig, n, l, r, field="complex"):
+        # 在 PlotWorker 的工作线程里执行: 只画到传入的 fig 上, 不碰 Tk 控件
+        passed, val, lb, ub, viol = utils.check_weighted_theorem(n, l, r, stress_mode=False, field=field)
+        
+        ax = fig.add_subplot(111)
+        y_pos = 1
+        ax.errorbar(val, y_pos, xerr=0, fmt='o', color='#d62728', markersize=10, label=r'Actual $\sum \mu$')
+        ax.plot([lb, ub], [y_pos, y_pos], '|--', color='blue', linewidth=3, markersize=15, label='Theoretical Bounds')
+        
+        title_text = f"Check n={n} ({field}), Window=[{l+1}, {r+1}]\nLHS={lb:.4f} <= Actual={val:.4f} <= RHS={ub:.4f}"
+        ax.set_title(title_text, fontsize=11)
+        ax.set_yticks([])
+        ax.legend(loc='upper right')
+        margin = (ub - lb) * 0.2 if ub != lb else 0.5
+        ax.set_xlim(lb - margin, ub + margin)
+        ax.set_ylim(0.8, 1.2)
+        fig.tight_layout()
 
-    def run_audit(self):
+    def run_audit_thread(self, resume=False):
+        # 控件只在主线程读取; 已有任务在跑时 start 直接忽略
         try:
-            min_n = int(self.spin_min_n.get())
-            max_n = int(self.spin_max_n.get())
-            samples = int(self.spin_iter.get())
-            if min_n > max_n: return
+            params = (int(self.spin_min_n.get()), int(self.spin_max_n.get()), int(self.spin_iter.get()), self.var_stages.get(),
+                      self.var_all_windows.get())
+        except ValueError as e:
+            self.lbl_result.config(text=f"Error: {e}")
+            return
+        self.job.start(self.run_audit, resume, params)
 
-            self.btn_mass.config(state="disabled")
-            self.lbl_result.config(text="Running Stress Test...", bootstyle="warning")
-            
-            report_data = []
+    def checkpoint_path(self):
+        return os.path.join(self.output_dir, "weighted_audit.ckpt.json")
+
+    def run_audit(self, resume, params):
+        job = self.job
+        try:
+            state = checkpoint.load_state(self.checkpoint_path()) if resume else None
+            if resume and state is None:
+                job.post(self.lbl_result.config, text="No checkpoint to resume.", bootstyle="secondary")
+                return
+            if state is None:
+                min_n, max_n, samples, stages, all_windows = params
+                if min_n > max_n:
+                    job.post(self.lbl_result.config, text="Min n must not exceed Max n.", bootstyle="secondary")
+                    return
+                seed = audits.new_run_seed()
+                stamp = self.get_timestamp()
+                # 逐样本结果写进预分配的 .npy 列 (内存映射), 每满一块整块写入
+                samples_dir = result_sink.create_columns(os.path.join(self.output_dir, f"Weighted_Samples_{stamp}_seed{seed}"),
+                                                         "weighted", seed, (max_n - min_n + 1) * samples)
+                state = {"min_n": min_n, "max_n": max_n, "samples": samples, "seed": seed, "stamp": stamp, "all_windows": all_windows,
+                         "samples_dir": samples_dir, "n": min_n, "i": 0, "failures": 0, "max_viol": 0.0, "report": [],
+                         "stages": utils.StageProfile().to_dict() if stages else None}
+            # 从断点继续时参数全部取自断点文件; 下一个样本是 (n, i), 已完成的 n 在 report 里
+            min_n, max_n, samples = state["min_n"], state["max_n"], state["samples"]
+            seed, stamp, samples_dir = state["seed"], state["stamp"], state["samples_dir"]
+            # 旧断点没有该字段, 当时只有单窗口模式
+            sampler = audits.sample_weighted_windows if state.get("all_windows") else audits.sample_weighted
+            # 阶段计时随断点保存, 继续时接着累计 (是否记录也以断点为准)
+            profile = None if state.get("stages") is None else utils.StageProfile.from_dict(state["stages"])
+
+            print(f"[Run] Weighted stress test, n={min_n}..{max_n}, seed={seed}"
+                  + (", all windows" if state.get("all_windows") else "")
+                  + (f" (resumed at n={state['n']}, sample {state['i']})" if resume else ""))
+            report_data = [tuple(row) for row in state["report"]]
             total_steps = (max_n - min_n + 1) * samples
-            current_step = 0
+            current_step = (state["n"] - min_n) * samples + state["i"]
+            sink = result_sink.ResultSink(samples_dir, offset=current_step)
+            job.set_total(total_steps, current_step)
+
+            def save_checkpoint(n, i, failures, max_viol):
+                sink.sync()
+                state.update(n=n, i=i, failures=failures, max_viol=max_viol, report=report_data,
+                             stages=None if profile is None else profile.to_dict())
+                checkpoint.save_state(self.checkpoint_path(), state)
             
-            for n in range(min_n, max_n + 1):
-                failures = 0
-                max_viol = 0.0
+            with utils.collect_stages(profile):
+                for n in range(state["n"], max_n + 1):
+                    resumed = (n == state["n"])
+                    failures = state["failures"] if resumed else 0
+                    max_viol = state["max_viol"] if resumed else 0.0
                 
-                for i in range(samples):
-                    if n < 2: break
-                    limit = n - 1
-                    l = np.random.randint(0, limit)
-                    r = np.random.randint(l, limit)
+                    job.stage = f"Stress Testing n={n}"
+                    for i in range(state["i"] if resumed else 0, samples):
+                        if n < 2: break
+                        if job.cancelled:
+                            save_checkpoint(n, i, failures, max_viol)
+                            sink.close()
+                            job.post(self.lbl_result.config, text=f"Cancelled at n={n}, sample {i}.\nCheckpoint saved; Resume to continue.",
+                                     bootstyle="secondary")
+                            return
+                        # 样本 (seed, n, i) 可用 audit_cli replay 单独重放
+                        is_pass, viol, slack, params, values = sampler(n, audits.sample_rng("weighted", n, seed, i))
+                        sink.append(n, params, i, is_pass, viol, slack, values)
                     
-                    is_pass, _, _, _, viol = utils.check_weighted_theorem(n, l, r, stress_mode=True)
+                        if not is_pass:
+                            failures += 1
+                            max_viol = max(max_viol, viol)
                     
-                    if not is_pass:
-                        failures += 1
-                        max_viol = max(max_viol, viol)
-                    
-                    current_step += 1
-                    if current_step % 50 == 0:
-                        self.progress['value'] = (current_step / total_steps) * 100
-                        self.lbl_result.config(text=f"Stress Testing n={n}...")
+                        current_step += 1
+                        job.done = current_step
+                        if (i + 1) % checkpoint.CHECKPOINT_EVERY == 0:
+                            save_checkpoint(n, i + 1, failures, max_viol)
                 
-                report_data.append((n, samples, failures, max_viol))
+                    report_data.append((n, samples, failures, max_viol))
+                    save_checkpoint(n + 1, 0, 0, 0.0)
             
-            self.progress['value'] = 100
+            result_sink.finish(samples_dir, sink.close())
+            checkpoint.clear_state(self.checkpoint_path())
+            print(f"[Output] Per-sample columns saved to: {os.path.abspath(samples_dir)}")
             
             # --- 导出 CSV 逻辑 ---
-            csv_filename = f"Audit_Report_{self.get_timestamp()}.csv"
+            csv_filename = f"Audit_Report_{stamp}_seed{seed}.csv"
             csv_path = os.path.join(self.output_dir, csv_filename)
             
             with open(csv_path, 'w', newline='') as f:
@@ -220,17 +290,19 @@ class WeightedTab:
             # 打印绝对路径
             abs_csv_path = os.path.abspath(csv_path)
             print(f"[Output] Audit data saved to: {abs_csv_path}")
+            if profile is not None:
+                stage_report.save_stages(os.path.join(samples_dir, stage_report.STAGES_FILE), profile,
+                                         theorem="weighted", min_n=min_n, max_n=max_n, samples=samples, seed=seed,
+                                         all_windows=bool(state.get("all_windows")))
             
-            self.lbl_result.config(text="Audit Complete & Saved!", bootstyle="success")
-            self.frame.after(0, lambda: self.show_report(report_data))
+            job.post(self.lbl_result.config, text=f"Audit Complete & Saved!\nSeed: {seed}", bootstyle="success")
+            job.post(self.show_report, report_data, profile)
             
         except Exception as e:
-            self.lbl_result.config(text=f"Error: {e}")
-            messagebox.showerror("Audit Error", str(e))
-        finally:
-            self.btn_mass.config(state="normal")
+            job.post(self.lbl_result.config, text=f"Error: {e}", bootstyle="danger")
+            job.post(messagebox.showerror, "Audit Error", str(e))
 
-    def show_report(self, data):
+    def show_report(self, data, profile=None):
         top = ttk.Toplevel()
         top.title("Stress Test Report")
         top.geometry("600x400")
@@ -251,4 +323,7 @@ class WeightedTab:
         tree.tag_configure("fail", foreground="red")
         tree.tag_configure("pass", foreground="green")
         tree.pack(fill=BOTH, expand=True, padx=10, pady=10)
+        if profile is not None:
+            top.geometry("760x640")
+            stage_report.add_stage_table(top, profile)
         ttk.Button(top, text="Close", command=top.destroy, bootstyle="secondary").pack(pady=10)
\ No newline at end of file